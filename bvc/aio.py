@@ -0,0 +1,321 @@
+"""asyncio HTTP transport for Buildout Versions Checker"""
+import asyncio
+import ssl
+from email.parser import Parser
+from http.client import HTTPMessage
+from urllib.error import HTTPError
+from urllib.error import URLError
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
+from urllib.request import getproxies
+
+from bvc.transport import ACCEPT_ENCODING
+from bvc.transport import ConnectError
+from bvc.transport import Deadline
+from bvc.transport import REDIRECT_CODES
+from bvc.transport import Response
+from bvc.transport import find_proxy
+from bvc.transport import proxy_headers
+
+
+class AsyncBodyReader(object):
+    """
+    Reads the body of an HTTP response from a stream,
+    decoding the chunked transfer encoding.
+    """
+
+    def __init__(self, reader, chunked=False, length=None):
+        self.reader = reader
+        self.chunked = chunked
+        self.remaining = chunked and 0 or length
+        self.started = False
+        self.done = self.remaining == 0 and not chunked
+
+    async def read(self, size):
+        """
+        Reads at most size bytes of the body,
+        returns an empty string at the end.
+        """
+        if self.done:
+            return b''
+
+        if self.chunked and not self.remaining:
+            if self.started:
+                await self.reader.readexactly(2)
+            self.started = True
+            line = await self.reader.readline()
+            self.remaining = int(line.split(b';', 1)[0].strip(), 16)
+            if not self.remaining:
+                while (await self.reader.readline()) not in (
+                        b'\r\n', b'\n', b''):
+                    pass
+                self.done = True
+                return b''
+
+        if self.remaining is None:
+            data = await self.reader.read(size)
+            self.done = not data
+            return data
+
+        data = await self.reader.read(min(size, self.remaining))
+        if not data:
+            raise asyncio.IncompleteReadError(data, self.remaining)
+        self.remaining -= len(data)
+        self.done = not self.remaining and not self.chunked
+        return data
+
+
+class AsyncResponse(Response):
+    """
+    HTTP response streaming its body within an event loop.
+    """
+
+    def __init__(self, *ka, **kw):
+        super(AsyncResponse, self).__init__(*ka, **kw)
+        self.consumed = self.consumed or self.stream.done
+
+    async def iter_chunks(self):
+        """
+        Yields the decoded chunks of the body as they are received.
+        """
+        try:
+            while not self.consumed:
+                timeout = self.chunk_timeout()
+                try:
+                    chunk = await asyncio.wait_for(
+                        self.stream.read(self.chunk_size), timeout)
+                except asyncio.TimeoutError:
+                    raise URLError('timed out')
+                except (asyncio.IncompleteReadError,
+                        ValueError, OSError) as error:
+                    raise URLError(error)
+                if not chunk:
+                    self.consumed = True
+                for piece in self.decode(chunk):
+                    yield piece
+        finally:
+            self.close()
+
+    async def read(self):
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+
+
+class AsyncHTTPTransport(object):
+    """
+    asyncio HTTP client keeping persistent connections
+    per host, reused across requests.
+    """
+    max_redirects = 5
+    user_agent = 'buildout-versions-checker'
+
+    def __init__(self, timeout=10, connect_timeout=None, read_timeout=None):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout or timeout
+        self.read_timeout = read_timeout or timeout
+        self.proxies = getproxies()
+        self.idle = {}
+        self.connections = 0
+        self.requests = 0
+
+    async def open_connection(self, scheme, netloc):
+        """
+        Opens a new connection to a host, through a proxy if needed,
+        returns the streams and the headers for the proxy.
+        """
+        target = urlsplit('//%s' % netloc)
+        port = target.port or (scheme == 'https' and 443 or 80)
+        context = None
+        if scheme == 'https':
+            context = ssl.create_default_context()
+
+        proxy = find_proxy(self.proxies, scheme, target.hostname)
+        if proxy is None:
+            reader, writer = await asyncio.open_connection(
+                target.hostname, port, ssl=context)
+            return reader, writer, None
+
+        headers = proxy_headers(proxy)
+        reader, writer = await asyncio.open_connection(
+            proxy.hostname, proxy.port or 80)
+        if scheme == 'http':
+            return reader, writer, headers
+
+        if not hasattr(writer, 'start_tls'):
+            writer.close()
+            raise URLError('Tunnelling through a proxy '
+                           'requires Python 3.11 or more')
+        request = 'CONNECT %s:%d HTTP/1.1\r\nHost: %s:%d\r\n' % (
+            target.hostname, port, target.hostname, port)
+        for name, value in headers.items():
+            request += '%s: %s\r\n' % (name, value)
+        writer.write(('%s\r\n' % request).encode('latin-1'))
+        status, reason, response_headers, body, will_close = (
+            await self.read_response(reader, 'CONNECT'))
+        if status != 200:
+            writer.close()
+            raise URLError('Tunnel connection failed: %d %s' % (
+                status, reason))
+        await writer.start_tls(context, server_hostname=target.hostname)
+        return reader, writer, None
+
+    async def get_connection(self, scheme, netloc):
+        """
+        Returns an idle connection for a host,
+        opening a new one if none is available.
+        """
+        idle = self.idle.get((scheme, netloc))
+        if idle:
+            return idle.pop() + (True,)
+
+        connection = await self.open_connection(scheme, netloc)
+        self.connections += 1
+        return connection + (False,)
+
+    async def read_response(self, reader, method='GET'):
+        """
+        Reads the head of an HTTP response, skipping the informational
+        ones, returns the status, the reason, the headers, a reader
+        for the body and if the connection will be closed.
+        """
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError(
+                    'Remote end closed connection without response')
+            version, status, reason = (
+                line.decode('latin-1').rstrip('\r\n').split(' ', 2) +
+                [''])[:3]
+            status = int(status)
+
+            lines = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                lines.append(line.decode('latin-1'))
+            headers = Parser(_class=HTTPMessage).parsestr(''.join(lines))
+            if status >= 200:
+                break
+
+        connection = headers.get('Connection', '').lower()
+        will_close = 'close' in connection or (
+            version == 'HTTP/1.0' and 'keep-alive' not in connection)
+        length = headers.get('Content-Length')
+
+        if method == 'CONNECT' or status in (204, 304):
+            body = AsyncBodyReader(reader, length=0)
+        elif 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            body = AsyncBodyReader(reader, chunked=True)
+        elif length is not None:
+            body = AsyncBodyReader(reader, length=int(length))
+        else:
+            body = AsyncBodyReader(reader)
+            will_close = True
+
+        return status, reason, headers, body, will_close
+
+    async def send(self, url, headers={}, deadline=None):
+        """
+        Sends a GET request on a persistent connection
+        and returns the response, before reading its body.
+        """
+        deadline = deadline or Deadline()
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+
+        while True:
+            reader = writer = None
+            reused = False
+            try:
+                try:
+                    reader, writer, proxy, reused = await asyncio.wait_for(
+                        self.get_connection(*key),
+                        deadline.timeout(self.connect_timeout))
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        ValueError, OSError) as error:
+                    if isinstance(error, asyncio.TimeoutError):
+                        error = 'timed out'
+                    raise ConnectError(error)
+                target = path
+                request_headers = {'Host': parts.netloc,
+                                   'User-Agent': self.user_agent,
+                                   'Accept-Encoding': ACCEPT_ENCODING}
+                request_headers.update(headers)
+                if proxy is not None:
+                    target = url
+                    request_headers.update(proxy)
+                request = 'GET %s HTTP/1.1\r\n' % target
+                for name, value in request_headers.items():
+                    request += '%s: %s\r\n' % (name, value)
+                self.requests += 1
+                writer.write(('%s\r\n' % request).encode('latin-1'))
+                status, reason, response_headers, body, will_close = (
+                    await asyncio.wait_for(
+                        self.read_response(reader),
+                        deadline.timeout(self.read_timeout)))
+            except (URLError, asyncio.CancelledError):
+                if writer is not None:
+                    writer.close()
+                raise
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                    ValueError, OSError) as error:
+                if writer is not None:
+                    writer.close()
+                if reused:
+                    # The server has closed the idle connection,
+                    # retry once on a fresh one.
+                    continue
+                if isinstance(error, asyncio.TimeoutError):
+                    error = 'timed out'
+                raise URLError(error)
+
+            def release(reusable, connection=(reader, writer, proxy),
+                        will_close=will_close):
+                if reusable and not will_close:
+                    self.idle.setdefault(key, []).append(connection)
+                else:
+                    connection[1].close()
+
+            return AsyncResponse(url, status, reason, response_headers,
+                                 body, release, timeout=self.read_timeout,
+                                 deadline=deadline)
+
+    async def urlopen(self, url, headers={}, deadline=None):
+        """
+        Opens an URL like urllib.request.urlopen does,
+        following the redirections within the deadline.
+        """
+        for redirection in range(self.max_redirects + 1):
+            response = await self.send(url, headers, deadline)
+            location = response.getheader('Location')
+            if response.status in REDIRECT_CODES and location:
+                await response.read()
+                url = urljoin(url, location)
+                continue
+            if response.status >= 400:
+                await response.read()
+                raise HTTPError(url, response.status, response.reason,
+                                response.headers, None)
+            return response
+
+        raise HTTPError(url, response.status,
+                        'Too many redirections',
+                        response.headers, None)
+
+    async def close(self):
+        """
+        Closes all the persistent connections.
+        """
+        writers = [writer for idle in self.idle.values()
+                   for reader, writer, proxy in idle]
+        self.idle.clear()
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
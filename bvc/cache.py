@@ -0,0 +1,162 @@
+"""Releases cache for Buildout Versions Checker"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from bvc.logger import logger
+
+
+class ReleasesCache(object):
+    """
+    On-disk cache of the releases of the packages,
+    stored with their validators for revalidating them,
+    and of the packages unknown by the services.
+    """
+
+    def __init__(self, directory, max_age=0, max_entries=10000,
+                 unknown_max_age=86400):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.unknown_max_age = unknown_max_age
+
+    def path(self, service_url, package):
+        """
+        Returns the path of the entry of a package on a service.
+        """
+        key = '%s %s' % (service_url.rstrip('/'), package.lower())
+        return os.path.join(
+            self.directory,
+            '%s.json' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+        )
+
+    def get(self, service_url, package):
+        """
+        Returns the cached entry of a package on a service, or None,
+        marking the entry as recently used.
+        """
+        path = self.path(service_url, package)
+        try:
+            with open(path, 'rb') as fd:
+                entry = json.loads(fd.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # A read-only cache is still used.
+            pass
+        return entry
+
+    def set(self, service_url, package, releases, headers):
+        """
+        Stores the sorted releases of a package on a service,
+        with the validators found in the headers of the response.
+        """
+        self.write({
+            'service_url': service_url,
+            'package': package,
+            'releases': list(releases),
+            'sorted': True,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched': time.time()
+        })
+
+    def set_unknown(self, service_url, package, status):
+        """
+        Stores that a package is unknown by a service,
+        with the status of the response telling it.
+        """
+        self.write({
+            'service_url': service_url,
+            'package': package,
+            'releases': [],
+            'sorted': True,
+            'unknown': status,
+            'fetched': time.time()
+        })
+
+    def refresh(self, entry, headers):
+        """
+        Stores again an entry revalidated by a response.
+        """
+        entry = dict(entry, fetched=time.time())
+        for key, header in (('etag', 'ETag'),
+                            ('last_modified', 'Last-Modified')):
+            entry[key] = headers.get(header) or entry.get(key)
+        self.write(entry)
+
+    def write(self, entry):
+        """
+        Writes atomically an entry, so concurrent runs
+        never read a partial file.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(
+                dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as temp_file:
+                    temp_file.write(json.dumps(entry).encode('utf-8'))
+                os.replace(temp_path, self.path(
+                    entry['service_url'], entry['package']))
+            except OSError:
+                os.remove(temp_path)
+                raise
+        except OSError as error:
+            logger.debug('!> Cannot cache %s: %s', entry['package'], error)
+
+    def fresh(self, entry):
+        """
+        Checks if an entry is young enough to be used
+        without revalidation, the entries of the unknown
+        packages having their own maximum age.
+        """
+        if entry is None:
+            return False
+        max_age = self.max_age
+        if entry.get('unknown'):
+            max_age = self.unknown_max_age
+        return time.time() - entry.get('fetched', 0) < max_age
+
+    def validators(self, entry):
+        """
+        Returns the headers for revalidating an entry.
+        """
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def prune(self):
+        """
+        Removes the least recently used entries
+        exceeding the maximum number of entries.
+        """
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue
+
+        entries.sort(reverse=True)
+        for mtime, path in entries[self.max_entries:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
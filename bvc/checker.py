@@ -1,20 +1,54 @@
 """
 Version checker for Buildout Versions Checker
 """
-import json
+import asyncio
 import os
-import socket
+import time
 from collections import OrderedDict
 from concurrent import futures
 from configparser import NoSectionError
+from fnmatch import fnmatchcase
+from urllib.error import HTTPError
 from urllib.error import URLError
-from urllib.request import urlopen
+from urllib.parse import urlsplit
 
-from bvc.configparser import VersionsConfigParser
+from bvc.aio import AsyncHTTPTransport
+from bvc.cache import ReleasesCache
+from bvc.configparser import iter_section_options
+from bvc.extends import ExtendsResolver
 from bvc.logger import logger
+from bvc.parsing import AsyncParsingPool
+from bvc.parsing import ParsingPool
+from bvc.releases import JSONReleasesParser
+from bvc.releases import SIMPLE_ACCEPT
+from bvc.releases import SimpleHTMLReleasesParser
+from bvc.releases import SimpleJSONReleasesParser
+from bvc.releases import sort_releases
+from bvc.retry import CircuitBreaker
+from bvc.retry import CircuitOpen
+from bvc.retry import Hedging
+from bvc.retry import Ranking
+from bvc.retry import backoff
+from bvc.retry import retry_after
+from bvc.retry import retryable
+from bvc.throttle import AdaptiveLimit
+from bvc.throttle import AsyncThrottle
+from bvc.throttle import Limit
+from bvc.throttle import Throttle
+from bvc.throttle import TokenBucket
+from bvc.transport import Deadline
+from bvc.transport import HTTPTransport
+from bvc.versions import hit_rates
+from bvc.versions import parse_version
+from bvc.versions import specifier_set
 
-from packaging.specifiers import SpecifierSet
-from packaging.version import parse as parse_version
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion
+
+SERVICE_URLS = {
+    'json': 'https://pypi.python.org/pypi',
+    'simple': 'https://pypi.org/simple'
+}
 
 
 class VersionsChecker(object):
@@ -22,15 +56,52 @@ class VersionsChecker(object):
     Checks updates of packages from a config file on Pypi.
     """
     default_version = '0.0.0'
+    transport = None
+    throttle = None
+    rate_limit = None
+    hedging = None
+    hedger = None
+    parsers = None
+    processes = 0
+    extends = True
+    resolver = None
+    ranking = None
+    breakers = None
+    max_failures = 5
+    deadline = None
+    run_deadline = None
+    unchecked = None
+    cache = None
+    retries = 2
+    retry_backoff = 0.5
+    include_unknown = False
+    routes = {}
+    host_limits = {}
+    api = 'json'
+    connect_timeout = None
+    read_timeout = None
+    versions = None
+    package_specifiers = None
+    last_versions = None
+    updates = None
 
     def __init__(self, source,
                  specifiers={}, allow_pre_releases=False,
                  includes=[], excludes=[],
-                 service_url='https://pypi.python.org/pypi',
-                 timeout=10, threads=10):
+                 service_url=None,
+                 timeout=10, threads=10, engine='threads',
+                 cache_dir=None, max_age=0, cache_size=10000,
+                 api='json', connect_timeout=None, read_timeout=None,
+                 retries=2, hedge=False,
+                 unknown_max_age=86400, include_unknown=False,
+                 routes={}, host_limits={}, rate=None, rate_file=None,
+                 max_failures=5, deadline=None, processes=0,
+                 lazy=False):
         """
         Parses a config file containing pinned versions
-        of eggs and check available updates.
+        of eggs and check available updates, or only records
+        the settings when lazy, leaving the stages to parse,
+        fetch and diff or to iter_updates.
         """
         self.source = source
         self.includes = includes
@@ -38,53 +109,110 @@ class VersionsChecker(object):
         self.specifiers = specifiers
         self.allow_pre_releases = allow_pre_releases
         self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.max_failures = max_failures
+        self.deadline = deadline
+        self.processes = processes
+        self.include_unknown = include_unknown
+        self.routes = routes
+        self.host_limits = host_limits
+        if rate:
+            self.rate_limit = TokenBucket(rate, path=rate_file)
+        if hedge:
+            self.hedging = Hedging()
         self.threads = threads
-        self.service_url = service_url
+        self.engine = engine
+        if isinstance(service_url, str):
+            service_url = [service_url]
+        self.service_urls = service_url or [SERVICE_URLS[api]]
+        self.service_url = self.service_urls[0]
+        self.api = api
+        if cache_dir:
+            self.cache = ReleasesCache(
+                cache_dir, max_age, cache_size, unknown_max_age)
 
-        self.source_versions = OrderedDict(
-            self.parse_versions(self.source)
-        )
-        self.versions = self.include_exclude_versions(
-            self.source_versions, self.includes, self.excludes
-        )
-        self.package_specifiers = self.build_specifiers(
-            self.versions.keys(), self.specifiers
-        )
-        self.last_versions = OrderedDict(
-            self.fetch_last_versions(
-                self.package_specifiers,
-                self.allow_pre_releases,
-                self.service_url,
-                self.timeout,
-                self.threads
+        if not lazy:
+            self.diff()
+
+    def parse(self, refresh=False):
+        """
+        Parses the source file to find the packages to check,
+        once unless refreshed, the next stages being reset.
+        """
+        if self.versions is None or refresh:
+            self.source_versions = OrderedDict(
+                self.parse_versions(self.source)
             )
-        )
-        self.updates = OrderedDict(
-            self.find_updates(
-                self.versions, self.last_versions
+            self.versions = self.include_exclude_versions(
+                self.source_versions, self.includes, self.excludes
             )
-        )
+            self.package_specifiers = self.build_specifiers(
+                self.versions.keys(), self.specifiers
+            )
+            self.last_versions = None
+            self.updates = None
+        return self.versions
 
-    def parse_versions(self, source):
+    def fetch(self, refresh=False):
         """
-        Parses the source file to return the packages
-        with their current versions.
+        Fetches the last versions of the packages parsed,
+        once unless refreshed, the updates being reset.
         """
-        config = VersionsConfigParser()
-        has_read = config.read(source)
+        self.parse()
+        if self.last_versions is None or refresh:
+            self.last_versions = OrderedDict(
+                self.iter_last_versions(
+                    self.package_specifiers,
+                    self.allow_pre_releases,
+                    self.service_urls,
+                    self.timeout,
+                    self.threads,
+                    self.engine
+                )
+            )
+            self.updates = None
+        return self.last_versions
 
-        if not has_read:
+    def diff(self, refresh=False):
+        """
+        Compares the current versions with the last versions
+        fetched to find the updates, once unless refreshed.
+        """
+        self.fetch()
+        if self.updates is None or refresh:
+            self.updates = OrderedDict(
+                self.find_updates(
+                    self.versions, self.last_versions
+                )
+            )
+        return self.updates
+
+    def parse_versions(self, source):
+        """
+        Parses the versions section of the source file, merged
+        over the files it extends if extends is set, to return
+        the packages with their current versions.
+        """
+        try:
+            if self.extends:
+                if self.resolver is None:
+                    self.resolver = ExtendsResolver()
+                versions = self.resolver.resolve(source)
+            else:
+                versions = self.read_versions(source)
+        except OSError:
             logger.warning("'%s' cannot be read.", source)
             return []
 
-        try:
-            versions = config.items('versions')
-        except NoSectionError:
+        if versions is None:
             logger.debug(
                 "'versions' section not found in %s.",
                 source
             )
             return []
+        versions = list(versions.items())
 
         logger.info(
             '- %d versions found in %s.',
@@ -93,6 +221,22 @@ class VersionsChecker(object):
 
         return versions
 
+    def read_versions(self, source):
+        """
+        Parses the versions section of the source file alone,
+        streaming its lines, or returns None without section.
+        The versions removed by -= are ignored.
+        """
+        with open(source) as fd:
+            try:
+                return OrderedDict(
+                    (package, version) for package, operator, version
+                    in iter_section_options(fd, 'versions', source)
+                    if operator != '-'
+                )
+            except NoSectionError:
+                return None
+
     def include_exclude_versions(self, source_versions,
                                  includes=[], excludes=[]):
         """
@@ -137,66 +281,979 @@ class VersionsChecker(object):
         return specifiers
 
     def fetch_last_versions(self, packages, allow_pre_releases,
-                            service_url, timeout, threads):
+                            service_url, timeout, threads,
+                            engine='threads'):
         """
-        Fetch the latest versions of a list of packages with specifiers,
-        in a threaded manner or not.
+        Fetch the latest versions of a list of packages with specifiers.
         """
-        versions = []
+        return list(
+            self.iter_last_versions(
+                packages, allow_pre_releases,
+                service_url, timeout, threads, engine
+            )
+        )
+
+    def iter_last_versions(self, packages, allow_pre_releases,
+                           service_url, timeout, threads,
+                           engine='threads'):
+        """
+        Yields the latest versions of packages with specifiers as they
+        are fetched, with threads or asyncio, sharing persistent
+        connections. The packages are taken from the iterable as the
+        requests in flight complete.
+        Several service URLs are mirrors of the same index raced
+        for each package, the first one keying the cache.
+        Raises CircuitOpen when an index has failed too many times
+        in a row, without any other index to check the packages.
+        The packages not checked before the deadline of the run
+        have no version.
+        """
+        if not isinstance(service_url, str):
+            if len(service_url) > 1:
+                self.ranking = Ranking(service_url)
+            service_url = service_url[0]
+        self.breakers = {}
+        self.run_deadline = Deadline(self.deadline)
+        self.unchecked = set()
+        memo = hit_rates()
 
-        if threads > 1:
-            with futures.ThreadPoolExecutor(
-                    max_workers=threads
-            ) as executor:
-                tasks = [
-                    executor.submit(
-                        self.fetch_last_version,
+        if engine == 'asyncio':
+            versions = self.run_async(
+                self.iter_last_versions_async(
+                    packages, allow_pre_releases,
+                    service_url, timeout, threads
+                )
+            )
+        else:
+            versions = self.iter_versions(
+                packages, allow_pre_releases,
+                service_url, timeout, threads
+            )
+
+        try:
+            yield from versions
+            self.report_deadline(len(self.unchecked))
+        finally:
+            versions.close()
+            self.report_memo(memo)
+            self.ranking = None
+            self.breakers = None
+            self.run_deadline = None
+            self.unchecked = None
+            if self.cache is not None:
+                self.cache.prune()
+
+    def iter_versions(self, packages, allow_pre_releases,
+                      service_url, timeout, threads):
+        """
+        Yields the latest versions of packages with specifiers
+        as they are fetched by threads.
+        """
+        self.transport = HTTPTransport(
+            timeout, self.connect_timeout, self.read_timeout)
+        if threads == 'auto':
+            self.throttle = Throttle(AdaptiveLimit())
+            threads = self.throttle.limit.maximum
+        if self.hedging is not None or self.ranking is not None:
+            self.hedger = futures.ThreadPoolExecutor(
+                max_workers=2 * max(threads, 1))
+        if self.processes:
+            self.parsers = ParsingPool(self.processes)
+        try:
+            if threads > 1:
+                yield from self.dispatch_versions(
+                    packages, allow_pre_releases,
+                    service_url, timeout, threads
+                )
+            else:
+                for package in packages:
+                    yield self.fetch_last_version(
                         package,
                         allow_pre_releases,
                         service_url,
                         timeout
                     )
-                    for package in packages
-                ]
-                for task in futures.as_completed(tasks):
-                    versions.append(task.result())
+        finally:
+            if self.hedger is not None:
+                # The duplicate requests still running
+                # are not waited for.
+                self.hedger.shutdown(wait=False)
+                self.hedger = None
+            if self.parsers is not None:
+                self.parsers.close()
+                self.parsers = None
+            self.transport.close()
+            self.report_transport(self.transport)
+            self.report_throttle(self.throttle)
+            self.transport = None
+            self.throttle = None
+
+    def dispatch_versions(self, packages, allow_pre_releases,
+                          service_url, timeout, threads):
+        """
+        Dispatch the fetching of the latest versions over the workers,
+        the hosts with a limit having their own workers, and yields
+        them as they are fetched. The tasks in flight are bounded
+        to twice the workers.
+        """
+        executors = {}
+        pending = {}
+        bound = 2 * (threads + sum(self.host_limits.values()))
+
+        try:
+            for package in packages:
+                while len(pending) >= bound:
+                    yield from self.completed_versions(
+                        pending, futures.wait(
+                            pending, self.run_deadline.remaining(),
+                            return_when=futures.FIRST_COMPLETED)[0])
+
+                host = self.route_host(package[0], service_url)
+                if host not in self.host_limits:
+                    host = None
+                if host not in executors:
+                    executors[host] = futures.ThreadPoolExecutor(
+                        max_workers=max(
+                            self.host_limits.get(host, threads), 1)
+                    )
+                task = executors[host].submit(
+                    self.fetch_last_version,
+                    package,
+                    allow_pre_releases,
+                    service_url,
+                    timeout
+                )
+                pending[task] = package
+
+            while pending:
+                yield from self.completed_versions(
+                    pending, futures.wait(
+                        pending, self.run_deadline.remaining(),
+                        return_when=futures.FIRST_COMPLETED)[0])
+        finally:
+            for task in pending:
+                task.cancel()
+            for executor in executors.values():
+                executor.shutdown()
+
+    async def iter_last_versions_async(self, packages, allow_pre_releases,
+                                       service_url, timeout, concurrency):
+        """
+        Yields the latest versions of packages with specifiers as they
+        are fetched concurrently within an asyncio event loop.
+        The tasks in flight are bounded to twice the concurrency.
+        """
+        if concurrency == 'auto':
+            throttle = AsyncThrottle(AdaptiveLimit())
+            concurrency = throttle.limit.maximum
         else:
+            throttle = AsyncThrottle(Limit(max(concurrency, 1)))
+        host_throttles = dict(
+            (host, AsyncThrottle(Limit(max(limit, 1))))
+            for host, limit in self.host_limits.items()
+        )
+        transport = AsyncHTTPTransport(
+            timeout, self.connect_timeout, self.read_timeout)
+        if self.processes:
+            self.parsers = AsyncParsingPool(self.processes)
+        pending = {}
+        bound = 2 * (max(concurrency, 1) + sum(self.host_limits.values()))
+
+        try:
             for package in packages:
-                versions.append(
-                    self.fetch_last_version(
+                while len(pending) >= bound:
+                    for version in await self.completed_versions_async(
+                            pending):
+                        yield version
+
+                task = asyncio.ensure_future(
+                    self.fetch_last_version_async(
                         package,
                         allow_pre_releases,
                         service_url,
-                        timeout
+                        transport,
+                        host_throttles.get(
+                            self.route_host(package[0], service_url),
+                            throttle)
                     )
                 )
+                pending[task] = package
 
+            while pending:
+                for version in await self.completed_versions_async(pending):
+                    yield version
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await transport.close()
+            if self.parsers is not None:
+                self.parsers.close()
+                self.parsers = None
+            self.report_transport(transport)
+            self.report_throttle(throttle)
+
+    async def completed_versions_async(self, pending):
+        """
+        Awaits the tasks in flight and returns the versions fetched.
+        """
+        done, not_done = await asyncio.wait(
+            pending, timeout=self.run_deadline.remaining(),
+            return_when=asyncio.FIRST_COMPLETED)
+        return self.completed_versions(pending, done)
+
+    def completed_versions(self, pending, done):
+        """
+        Returns the versions fetched by the tasks done, removing them
+        from the tasks in flight. Without any task done before the
+        deadline of the run, the tasks in flight are cancelled and
+        their packages have no version.
+        """
+        if not done:
+            versions = [(package[0], None) for package in pending.values()]
+            self.unchecked.update(package for package, version in versions)
+            for task in pending:
+                task.cancel()
+            pending.clear()
+            return versions
+
+        versions = []
+        for task in done:
+            del pending[task]
+            versions.append(task.result())
         return versions
 
+    def run_async(self, iterator):
+        """
+        Yields the items of an asynchronous iterator,
+        running it within a new event loop.
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            try:
+                loop.run_until_complete(iterator.aclose())
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
+                    task.cancel()
+                if tasks:
+                    loop.run_until_complete(
+                        asyncio.gather(*tasks, return_exceptions=True))
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                asyncio.set_event_loop(None)
+                loop.close()
+
+    def deadline_reached(self):
+        """
+        Checks if the deadline of the run is reached.
+        """
+        return (self.run_deadline is not None and
+                self.run_deadline.remaining() == 0)
+
+    def report_deadline(self, unchecked):
+        """
+        Report the packages not checked before the deadline of the run.
+        """
+        if self.deadline_reached():
+            logger.warning(
+                '- Deadline reached, %d packages not checked.',
+                unchecked
+            )
+
+    def report_memo(self, before):
+        """
+        Report the hit rates of the memoized versions
+        and specifiers since the hit rates before a run.
+        """
+        for name, (hits, misses, rate) in sorted(hit_rates().items()):
+            hits -= before[name][0]
+            misses -= before[name][1]
+            if hits + misses:
+                logger.debug(
+                    '- %d%% of the %s parsed from the memo '
+                    '(%d hits, %d misses).',
+                    100 * hits / (hits + misses), name, hits, misses
+                )
+
+    def report_transport(self, transport):
+        """
+        Report how many connections have been used by a transport.
+        """
+        if transport.requests:
+            logger.info(
+                '- %d requests sent over %d connections.',
+                transport.requests, transport.connections
+            )
+
+    def report_throttle(self, throttle):
+        """
+        Report the concurrency reached by an adaptive limit.
+        """
+        if throttle is not None and isinstance(
+                throttle.limit, AdaptiveLimit):
+            logger.info(
+                '- Concurrency adapted to %d requests.',
+                throttle.limit.concurrency
+            )
+
+    def overloaded(self, error):
+        """
+        Checks if an error is a sign of an overloaded index.
+        """
+        if isinstance(error, HTTPError):
+            return error.code in (429, 503)
+        return True
+
     def fetch_last_version(self, package, allow_pre_releases,
                            service_url, timeout):
         """
-        Fetch the last version of a package on Pypi.
+        Fetch the last version of a package on Pypi,
+        within the timeout.
+        """
+        package, specifier, service_url, entry, deadline = self.start_fetch(
+            package, allow_pre_releases, service_url, timeout)
+        if deadline is None:
+            return self.skipped_version(package, specifier, entry)
+
+        transport = self.transport or HTTPTransport(
+            timeout, self.connect_timeout, self.read_timeout)
+        releases = None
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    releases = self.request_indexes(
+                        transport, service_url, package, entry, deadline)
+                    break
+                except URLError as error:
+                    delay = self.attempt_failed(
+                        service_url, package, error, attempt, deadline)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+        finally:
+            if transport is not self.transport:
+                transport.close()
+
+        return self.select_last_version(package, specifier, releases)
+
+    def start_fetch(self, package, allow_pre_releases, service_url, timeout):
+        """
+        Returns the name, the specifier, the service URL and the cache
+        entry of a package with the deadline of its requests, None if
+        the cache entry is fresh or the deadline of the run is reached.
         """
         package, specifier = package
-        specifier = SpecifierSet(specifier, allow_pre_releases)
-        max_version = parse_version(self.default_version)
-        package_json_url = '%s/%s/json' % (service_url, package)
+        specifier = specifier_set(specifier, allow_pre_releases)
+        service_url = self.route(package, service_url)
+        entry = self.cache and self.cache.get(service_url, package)
+
+        deadline = None
+        if not self.fresh_entry(entry):
+            try:
+                deadline = self.package_deadline(timeout)
+                logger.info('> Fetching latest datas for %s...', package)
+            except URLError:
+                self.unchecked.add(package)
+        return package, specifier, service_url, entry, deadline
+
+    def skipped_version(self, package, specifier, entry):
+        """
+        Select the last version of a package not requested,
+        within a fresh cache entry, or no version once
+        the deadline of the run is reached.
+        """
+        if self.fresh_entry(entry):
+            return self.select_cached_version(package, specifier, entry)
+        return (package, None)
+
+    def attempt_failed(self, service_url, package, error, attempt, deadline):
+        """
+        Returns the delay before retrying a failed request of the
+        releases of a package, or None recording that it failed.
+        """
+        delay = self.retry_delay(error, attempt, deadline)
+        if delay is None:
+            self.failed_releases(service_url, package, error)
+        return delay
+
+    def package_deadline(self, timeout):
+        """
+        Returns the deadline of the requests fetching a package,
+        bounded by the deadline of the run.
+        """
+        if self.run_deadline is not None:
+            timeout = self.run_deadline.timeout(timeout)
+        return Deadline(timeout)
+
+    def route(self, package, service_url):
+        """
+        Returns the URL of the service checking a package,
+        the first route matching its name or the default one.
+        """
+        name = canonicalize_name(package)
+        for pattern, url in self.routes.items():
+            if fnmatchcase(name, canonicalize_name(pattern)):
+                return url
+        return service_url
+
+    def route_host(self, package, service_url):
+        """
+        Returns the host of the service checking a package.
+        """
+        return urlsplit(self.route(package, service_url)).netloc
+
+    def index_urls(self, service_url):
+        """
+        Returns the URLs of the indexes to request,
+        from the fastest when several are raced.
+        """
+        if self.ranking is None or service_url not in self.ranking.urls:
+            return [service_url]
+        return self.ranking.ranked()
+
+    def request_indexes(self, transport, service_url,
+                        package, entry, deadline):
+        """
+        Request the releases of a package on the indexes,
+        within the limit of concurrent requests.
+        """
+        throttle = self.throttle
+        if throttle is not None:
+            started = throttle.acquire()
+        overloaded = False
 
-        logger.info('> Fetching latest datas for %s...', package)
-        socket.setdefaulttimeout(timeout)
         try:
-            content = urlopen(package_json_url).read().decode('utf-8')
+            return self.race(self.request_releases, [
+                (transport, service_url, package, entry, deadline, index_url)
+                for index_url in self.index_urls(service_url)])
         except URLError as error:
-            content = '{"releases": []}'
-            logger.debug('!> %s %s', package_json_url, error.reason)
-        results = json.loads(content)
-        socket.setdefaulttimeout(None)
-
-        for version in specifier.filter(results['releases']):
-            version = parse_version(version)
-            if version > max_version:
+            overloaded = self.overloaded(error)
+            raise
+        finally:
+            if throttle is not None:
+                throttle.release(started, overloaded)
+
+    def request_releases(self, transport, service_url,
+                         package, entry, deadline, index_url=None):
+        """
+        Request the releases of a package on an index,
+        within the rate limit.
+        """
+        index_url = index_url or service_url
+        url, headers = self.index_request(index_url, package, entry)
+        if self.rate_limit is not None:
+            self.rate_limit.acquire()
+        begin = time.monotonic()
+        try:
+            response = transport.urlopen(url, headers, deadline)
+            releases = self.read_releases(
+                service_url, package, response, entry)
+        except URLError as error:
+            self.request_failed(index_url, package, error,
+                                time.monotonic() - begin)
+            raise
+        self.record_latency(index_url, time.monotonic() - begin)
+        return releases
+
+    def index_request(self, index_url, package, entry):
+        """
+        Returns the URL and the headers requesting the releases
+        of a package on an index, raises CircuitOpen if the index
+        has failed too many times in a row.
+        """
+        breaker = self.breaker(index_url)
+        if breaker is not None:
+            breaker.check()
+        return (self.package_url(index_url, package),
+                self.request_headers(entry))
+
+    def breaker(self, index_url):
+        """
+        Returns the circuit breaker of an index,
+        or None outside of a run.
+        """
+        if self.breakers is None:
+            return None
+        return self.breakers.setdefault(
+            index_url, CircuitBreaker(index_url, self.max_failures))
+
+    def record_latency(self, index_url, latency):
+        """
+        Records the latency of a successful request on an index.
+        """
+        if self.hedging is not None:
+            self.hedging.record(latency)
+        if self.ranking is not None:
+            self.ranking.record(index_url, latency)
+        breaker = self.breaker(index_url)
+        if breaker is not None:
+            breaker.record()
+
+    def request_failed(self, index_url, package, error, latency):
+        """
+        Logs a failed request on an index,
+        ranking it down if it looks unavailable.
+        """
+        logger.debug('!> %s %s', self.package_url(index_url, package),
+                     error.reason)
+        if self.ranking is not None and retryable(error):
+            self.ranking.failed(index_url, latency)
+        breaker = self.breaker(index_url)
+        if breaker is not None:
+            breaker.record(error, package)
+
+    def race(self, request, calls):
+        """
+        Calls a request on the indexes from the fastest, calling it
+        on the next one each time the previous one fails or is slower
+        than usual, and returns the first successful result.
+        """
+        if len(calls) == 1 or self.hedger is None:
+            errors = []
+            for args in calls:
+                try:
+                    return self.hedge(request, *args)
+                except URLError as error:
+                    errors.append(error)
+            raise self.race_error(errors)
+
+        begin = time.monotonic()
+        delay = self.ranking.stagger(calls[0][-1])
+        calls = list(calls)
+        tasks = {}
+        pending = set()
+        errors = []
+        timed_out = False
+        while calls or pending:
+            if self.race_next(calls, timed_out):
+                args = self.race_call(calls, tasks)
+                task = self.hedger.submit(request, *args)
+                tasks[task] = args[-1]
+                pending.add(task)
+            done, pending = futures.wait(
+                pending, delay if calls else None,
+                return_when=futures.FIRST_COMPLETED)
+            timed_out = not done
+            winner = self.race_winner(tasks, done, pending, begin, errors)
+            if winner is not None:
+                return winner.result()
+        raise self.race_error(errors)
+
+    def race_next(self, calls, timed_out):
+        """
+        Checks if the request is sent on the next index: at first,
+        once the requests in flight have failed, or when they are
+        slower than usual within the budget of duplicate requests.
+        """
+        return bool(calls) and (not timed_out or self.ranking.spend())
+
+    def race_call(self, calls, tasks):
+        """
+        Returns the arguments of the request sent
+        on the next index of a race.
+        """
+        args = calls.pop(0)
+        if tasks:
+            logger.debug('-> Racing the request of %s on %s.',
+                         args[2], args[-1])
+        return args
+
+    def race_winner(self, tasks, done, pending, begin, errors):
+        """
+        Returns the first successful request completed in a race,
+        ranking down the indexes outrun, or None collecting the
+        errors of the failed ones.
+        """
+        for task in done:
+            if task.exception() is None:
+                latency = time.monotonic() - begin
+                for outrun in pending:
+                    self.ranking.failed(tasks[outrun], latency)
+                return task
+            errors.append(task.exception())
+        return None
+
+    def race_error(self, errors):
+        """
+        Returns the error of a race lost on every index, the package
+        being unknown as soon as an index has answered so, and
+        the indexes being unavailable only if all of them are.
+        """
+        for error in errors:
+            if isinstance(error, HTTPError) and error.code in (404, 410):
+                return error
+        for error in errors:
+            if not isinstance(error, CircuitOpen):
+                return error
+        return errors[0]
+
+    def hedge(self, request, *args):
+        """
+        Calls a request, sending a duplicate if the first one
+        is slower than most of the previous ones, and returns
+        the first successful result.
+        """
+        delay = self.hedging and self.hedging.delay()
+        if delay is None or self.hedger is None:
+            return request(*args)
+
+        tasks = [self.hedger.submit(request, *args)]
+        done, pending = futures.wait(tasks, delay)
+        if not self.hedge_next(pending, args):
+            return tasks[0].result()
+
+        tasks.append(self.hedger.submit(request, *args))
+        pending = tasks
+        while pending:
+            done, pending = futures.wait(
+                pending, return_when=futures.FIRST_COMPLETED)
+            winner = self.hedge_winner(done)
+            if winner is not None:
+                return winner.result()
+        return tasks[0].result()
+
+    def hedge_next(self, pending, args):
+        """
+        Checks if a duplicate of a request still pending is sent,
+        within the budget of duplicate requests.
+        """
+        if not pending or not self.hedging.spend():
+            return False
+        logger.debug('-> Hedging the request of %s.', args[2])
+        return True
+
+    def hedge_winner(self, done):
+        """
+        Returns the first successful request among
+        the completed ones, or None.
+        """
+        for task in done:
+            if task.exception() is None:
+                return task
+        return None
+
+    async def fetch_last_version_async(self, package, allow_pre_releases,
+                                       service_url, transport, throttle):
+        """
+        Fetch the last version of a package on Pypi,
+        within the limit of concurrent requests and the timeout.
+        """
+        package, specifier, service_url, entry, deadline = self.start_fetch(
+            package, allow_pre_releases, service_url, transport.timeout)
+        if deadline is None:
+            return self.skipped_version(package, specifier, entry)
+
+        releases = None
+        for attempt in range(self.retries + 1):
+            try:
+                releases = await self.request_indexes_async(
+                    transport, service_url, package, entry,
+                    deadline, throttle)
+                break
+            except URLError as error:
+                delay = self.attempt_failed(
+                    service_url, package, error, attempt, deadline)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+
+        return self.select_last_version(package, specifier, releases)
+
+    async def request_indexes_async(self, transport, service_url,
+                                    package, entry, deadline, throttle):
+        """
+        Request the releases of a package on the indexes,
+        within the limit of concurrent requests.
+        """
+        started = await throttle.acquire()
+        overloaded = False
+
+        try:
+            return await self.race_async(self.request_releases_async, [
+                (transport, service_url, package, entry, deadline, index_url)
+                for index_url in self.index_urls(service_url)])
+        except URLError as error:
+            overloaded = self.overloaded(error)
+            raise
+        finally:
+            await throttle.release(started, overloaded)
+
+    async def request_releases_async(self, transport, service_url,
+                                     package, entry, deadline,
+                                     index_url=None):
+        """
+        Request the releases of a package on an index,
+        within the rate limit.
+        """
+        index_url = index_url or service_url
+        url, headers = self.index_request(index_url, package, entry)
+        if self.rate_limit is not None:
+            await asyncio.sleep(self.rate_limit.reserve())
+        begin = time.monotonic()
+        try:
+            response = await transport.urlopen(url, headers, deadline)
+            releases = await self.read_releases_async(
+                service_url, package, response, entry)
+        except URLError as error:
+            self.request_failed(index_url, package, error,
+                                time.monotonic() - begin)
+            raise
+        self.record_latency(index_url, time.monotonic() - begin)
+        return releases
+
+    async def hedge_async(self, request, *args):
+        """
+        Awaits a request, sending a duplicate if the first one
+        is slower than most of the previous ones, and returns
+        the first successful result.
+        """
+        delay = self.hedging and self.hedging.delay()
+        if delay is None:
+            return await request(*args)
+
+        tasks = [asyncio.ensure_future(request(*args))]
+        done, pending = await asyncio.wait(tasks, timeout=delay)
+        if not self.hedge_next(pending, args):
+            return await tasks[0]
+
+        tasks.append(asyncio.ensure_future(request(*args)))
+        pending = tasks
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = self.hedge_winner(done)
+                if winner is not None:
+                    return winner.result()
+            return tasks[0].result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def race_async(self, request, calls):
+        """
+        Awaits a request on the indexes from the fastest, awaiting it
+        on the next one each time the previous one fails or is slower
+        than usual, and returns the first successful result.
+        """
+        if len(calls) == 1:
+            return await self.hedge_async(request, *calls[0])
+
+        begin = time.monotonic()
+        delay = self.ranking.stagger(calls[0][-1])
+        calls = list(calls)
+        tasks = {}
+        pending = set()
+        errors = []
+        timed_out = False
+        try:
+            while calls or pending:
+                if self.race_next(calls, timed_out):
+                    args = self.race_call(calls, tasks)
+                    task = asyncio.ensure_future(request(*args))
+                    tasks[task] = args[-1]
+                    pending.add(task)
+                done, pending = await asyncio.wait(
+                    pending, timeout=delay if calls else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                timed_out = not done
+                winner = self.race_winner(tasks, done, pending,
+                                          begin, errors)
+                if winner is not None:
+                    return winner.result()
+            raise self.race_error(errors)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def failed_releases(self, service_url, package, error):
+        """
+        Records a package whose releases cannot be fetched, in the
+        cache if the package is unknown, so it has no version rather
+        than a bogus one, or as not checked if the deadline of the
+        run is reached.
+        """
+        if isinstance(error, HTTPError) and error.code in (404, 410):
+            logger.debug('-> %s unknown by the service.', package)
+            if self.cache is not None:
+                self.cache.set_unknown(service_url, package, error.code)
+        elif self.deadline_reached():
+            self.unchecked.add(package)
+
+    def retry_delay(self, error, attempt, deadline):
+        """
+        Returns the delay before retrying a failed request,
+        or None if it should not be retried.
+        """
+        if attempt >= self.retries or not retryable(error):
+            return None
+        delay = max(backoff(attempt, self.retry_backoff),
+                    retry_after(error) or 0)
+        try:
+            if deadline.timeout(delay) < delay:
+                return None
+        except URLError:
+            return None
+        return delay
+
+    def package_url(self, service_url, package):
+        """
+        Returns the URL listing the releases of a package.
+        """
+        if self.api == 'simple':
+            return '%s/%s/' % (service_url.rstrip('/'),
+                               canonicalize_name(package))
+        return '%s/%s/json' % (service_url, package)
+
+    def request_headers(self, entry):
+        """
+        Returns the headers negotiating the format of the releases
+        and revalidating the cached releases of a package.
+        """
+        headers = {}
+        if self.api == 'simple':
+            headers['Accept'] = SIMPLE_ACCEPT
+        if self.cache is not None:
+            headers.update(self.cache.validators(entry))
+        return headers
+
+    def releases_parser(self, package, response):
+        """
+        Returns the parser of the releases
+        for the format of a response.
+        """
+        if self.api == 'simple':
+            if 'json' in response.getheader('Content-Type', ''):
+                return SimpleJSONReleasesParser(package)
+            return SimpleHTMLReleasesParser(package)
+        return JSONReleasesParser(package)
+
+    def read_releases(self, service_url, package, response, entry):
+        """
+        Read the releases of a package while the response is received,
+        or parse them by a process once received, the cached ones
+        are used if they have not been modified.
+        """
+        try:
+            releases = self.not_modified_releases(package, response, entry)
+            if releases is None:
+                parser = self.releases_parser(package, response)
+                if self.parsers is not None:
+                    releases = self.parsers.parse(
+                        type(parser), package, response.read())
+                else:
+                    for chunk in response.iter_chunks():
+                        parser.feed(chunk)
+                    releases = sort_releases(parser.close())
+                releases = self.store_releases(
+                    service_url, package, response, releases)
+        finally:
+            response.close()
+
+        return releases
+
+    async def read_releases_async(self, service_url, package,
+                                  response, entry):
+        """
+        Read the releases of a package while the response is received,
+        or parse them by a process once received, the cached ones
+        are used if they have not been modified.
+        """
+        try:
+            releases = self.not_modified_releases(package, response, entry)
+            if releases is None:
+                parser = self.releases_parser(package, response)
+                if self.parsers is not None:
+                    releases = await self.parsers.parse(
+                        type(parser), package, await response.read())
+                else:
+                    async for chunk in response.iter_chunks():
+                        parser.feed(chunk)
+                    releases = sort_releases(parser.close())
+                releases = self.store_releases(
+                    service_url, package, response, releases)
+        finally:
+            response.close()
+
+        return releases
+
+    def not_modified_releases(self, package, response, entry):
+        """
+        Returns the cached releases of a package if the response
+        tells they have not been modified, otherwise None.
+        """
+        if response.status == 304 and entry is not None:
+            logger.debug('-> Releases of %s not modified.', package)
+            self.cache.refresh(entry, response.headers)
+            return self.cached_releases(entry)
+        return None
+
+    def store_releases(self, service_url, package, response, releases):
+        """
+        Stores in the cache the sorted releases read from a response.
+        """
+        if self.cache is not None:
+            self.cache.set(service_url, package, releases, response.headers)
+        return releases
+
+    def select_cached_version(self, package, specifier, entry):
+        """
+        Select the last version of a package within
+        the releases of a fresh cache entry, an unknown
+        package having no version.
+        """
+        if entry.get('unknown'):
+            logger.debug('-> %s unknown by the service, '
+                         'skipped until the cache expires.', package)
+            return (package, None)
+
+        logger.debug('-> Releases of %s served from the cache.', package)
+        return self.select_last_version(
+            package, specifier, self.cached_releases(entry))
+
+    def cached_releases(self, entry):
+        """
+        Returns the sorted releases of a cache entry,
+        the entries stored unsorted being sorted.
+        """
+        if entry.get('sorted'):
+            return entry['releases']
+        return sort_releases(entry['releases'])
+
+    def fresh_entry(self, entry):
+        """
+        Checks if a cache entry can be used without request,
+        the unknown packages being checked again if included.
+        """
+        if self.cache is None or not self.cache.fresh(entry):
+            return False
+        return not (self.include_unknown and entry.get('unknown'))
+
+    def select_last_version(self, package, specifier, releases):
+        """
+        Select the last version of a package within the sorted
+        releases allowed by the specifier, walking down from the
+        last release until the first one allowed.
+        """
+        if releases is None:
+            return (package, None)
+
+        max_version = parse_version(self.default_version)
+
+        for release in reversed(releases):
+            version = parse_version(release)
+            if version <= max_version:
+                break
+            if specifier.contains(version):
                 max_version = version
+                break
 
         logger.debug(
             '-> Last version of %s%s is %s.',
@@ -214,12 +1271,7 @@ class VersionsChecker(object):
 
         for package, current_version in versions.items():
             last_version = last_versions[package]
-            if last_version != current_version:
-                logger.debug(
-                    '=> %s current version (%s) and last '
-                    'version (%s) are different.',
-                    package, current_version, last_version
-                )
+            if self.is_update(package, current_version, last_version):
                 updates.append(
                     (package, last_version)
                 )
@@ -228,11 +1280,72 @@ class VersionsChecker(object):
 
         return updates
 
+    def iter_updates(self, refresh=False):
+        """
+        Yields the updates of the packages as their last versions
+        are fetched, as tuples (package, current version, last version),
+        the stages fetch and diff being done once all are yielded.
+        """
+        self.parse()
+        if self.updates is not None and not refresh:
+            for package, last_version in self.updates.items():
+                yield package, self.versions[package], last_version
+            return
+
+        last_versions = OrderedDict()
+        updates = OrderedDict()
+        for package, last_version in self.iter_last_versions(
+                self.package_specifiers,
+                self.allow_pre_releases,
+                self.service_urls,
+                self.timeout,
+                self.threads,
+                self.engine):
+            last_versions[package] = last_version
+            current_version = self.versions[package]
+            if self.is_update(package, current_version, last_version):
+                updates[package] = last_version
+                yield package, current_version, last_version
+
+        logger.info('- %d package updates found.', len(updates))
+        self.last_versions = last_versions
+        self.updates = updates
+
+    def is_update(self, package, current_version, last_version):
+        """
+        Checks if the last version of a package is an update.
+        """
+        if last_version is None:
+            logger.warning('- %s cannot be checked.', package)
+            return False
+        if self.different_versions(current_version, last_version):
+            logger.debug(
+                '=> %s current version (%s) and last '
+                'version (%s) are different.',
+                package, current_version, last_version
+            )
+            return True
+        return False
+
+    def different_versions(self, current_version, last_version):
+        """
+        Checks if two versions are different, comparing their
+        parsed versions unless one of them is invalid.
+        """
+        if last_version == current_version:
+            return False
+        try:
+            return (parse_version(last_version) !=
+                    parse_version(current_version))
+        except InvalidVersion:
+            return True
+
 
 class UnusedVersionsChecker(VersionsChecker):
     """
     Checks unused eggs in a config file.
     """
+    extends = False
 
     def __init__(self, source, egg_directory, excludes=[]):
         """
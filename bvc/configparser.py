@@ -1,5 +1,10 @@
 """Config parser for Buildout Versions Checker"""
 import re
+from configparser import DuplicateOptionError
+from configparser import DuplicateSectionError
+from configparser import MissingSectionHeaderError
+from configparser import NoSectionError
+from configparser import ParsingError
 from configparser import RawConfigParser
 from itertools import chain
 
@@ -7,6 +12,89 @@ from bvc.indentation import perfect_indentation
 
 OPERATORS = re.compile(r'[+-]$')
 
+SECTION = re.compile(r'\[(?P<header>.+)\]')
+
+OPTION = re.compile(
+    r'(?P<option>.*?)\s*(?P<operator>[+-]?)[=:]\s*(?P<value>.*)$')
+
+
+def iter_sections_options(lines, sections, source='<???>', found=None):
+    """
+    Yields the options of some sections within the lines of a buildout
+    file as tuples (section, option, operator, value), the operator
+    being '+', '-' or ''. The lines of the other sections are skipped
+    without being tokenized, their headers being recognized at
+    the beginning of the lines. The sections found are added to found.
+    """
+    if found is None:
+        found = set()
+    section = None
+    started = False
+    options = set()
+    option = option_indent = values = operator = None
+
+    for lineno, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if not stripped or stripped[0] in '#;':
+            continue
+        indent = len(line) - len(line.lstrip())
+
+        if option is not None:
+            if indent > option_indent:
+                values.append(stripped)
+                continue
+            yield section, option, operator, '\n'.join(values)
+            option = None
+
+        if stripped[0] == '[' and (not indent or section is None):
+            match = SECTION.match(stripped)
+            if match:
+                started = True
+                section = match.group('header')
+                if section not in sections:
+                    section = None
+                elif section in found:
+                    raise DuplicateSectionError(section, source, lineno)
+                else:
+                    found.add(section)
+                continue
+
+        if not started:
+            raise MissingSectionHeaderError(source, lineno, line)
+        if section is None:
+            continue
+
+        match = OPTION.match(stripped)
+        if match is None or not match.group('option'):
+            error = ParsingError(source)
+            error.append(lineno, line)
+            raise error
+        option, operator, value = match.group(
+            'option', 'operator', 'value')
+        if (section, option, operator) in options:
+            raise DuplicateOptionError(
+                section, option + operator, source, lineno)
+        options.add((section, option, operator))
+        option_indent = indent
+        values = [value]
+
+    if option is not None:
+        yield section, option, operator, '\n'.join(values)
+
+
+def iter_section_options(lines, section='versions', source='<???>'):
+    """
+    Yields the options of a section within the lines of a buildout
+    file as tuples (option, operator, value).
+    Raises NoSectionError once the lines are read without the section.
+    """
+    found = set()
+    for name, option, operator, value in iter_sections_options(
+            lines, (section,), source, found):
+        yield option, operator, value
+    if not found:
+        raise NoSectionError(section)
+
 
 class VersionsConfigParser(RawConfigParser, object):
     """
@@ -0,0 +1,145 @@
+"""Extends resolver for Buildout Versions Checker"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent import futures
+
+from bvc.configparser import iter_sections_options
+from bvc.logger import logger
+
+
+class ExtendsResolver(object):
+    """
+    Resolves the versions of a buildout file merged over the
+    local files it extends, the files being loaded in parallel
+    and cached by path and modification time.
+    """
+
+    def __init__(self, threads=4, section='versions'):
+        self.threads = threads
+        self.section = section
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        """
+        Returns the paths of the files extended by a file
+        and the options of its versions section, or None
+        without section, parsed once while it is not modified.
+        """
+        stat = os.stat(path)
+        mtime = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.files.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1:]
+
+        extends = []
+        options = []
+        found = set()
+        with open(path) as fd:
+            for section, option, operator, value in iter_sections_options(
+                    fd, ('buildout', self.section), path, found):
+                if section == self.section:
+                    options.append((option, operator, value))
+                elif option == 'extends':
+                    extends = self.extends_paths(path, value)
+        if self.section not in found:
+            options = None
+
+        with self.lock:
+            self.files[path] = (mtime, extends, options)
+        return extends, options
+
+    def extends_paths(self, path, value):
+        """
+        Returns the paths of the local files extended by a file,
+        relative to its directory.
+        """
+        paths = []
+        directory = os.path.dirname(path)
+        for extend in value.split():
+            if '://' in extend:
+                logger.warning("'%s' extended by %s is not a local file.",
+                               extend, path)
+                continue
+            paths.append(os.path.normpath(os.path.join(directory, extend)))
+        return paths
+
+    def resolve(self, source):
+        """
+        Returns the versions of a file merged over the files it
+        extends, or None without any versions section.
+        The extended files are loaded in parallel once per run.
+        Raises OSError if the file cannot be read.
+        """
+        source = os.path.abspath(source)
+        with futures.ThreadPoolExecutor(max_workers=self.threads) as pool:
+            tasks = {source: pool.submit(self.load, source)}
+            pending = [source]
+            while pending:
+                try:
+                    extends = tasks[pending.pop(0)].result()[0]
+                except OSError:
+                    continue
+                for path in extends:
+                    if path not in tasks:
+                        tasks[path] = pool.submit(self.load, path)
+                        pending.append(path)
+
+        return self.merge(source, tasks, {}, ())
+
+    def merge(self, path, tasks, merged, extending):
+        """
+        Returns the versions of a file loaded by a task, merged over
+        the versions of the files it extends, the extended files
+        being merged in order. A file extended again by itself
+        is skipped.
+        """
+        if path in merged:
+            return merged[path]
+
+        extends, options = tasks[path].result()
+        extending += (path,)
+        versions = None
+        for base in extends:
+            if base in extending:
+                logger.warning("'%s' extended recursively by %s.",
+                               base, path)
+                continue
+            try:
+                base_versions = self.merge(base, tasks, merged, extending)
+            except OSError:
+                logger.warning("'%s' extended by %s cannot be read.",
+                               base, path)
+                continue
+            if base_versions is not None:
+                if versions is None:
+                    versions = OrderedDict()
+                versions.update(base_versions)
+
+        if options is not None:
+            if versions is None:
+                versions = OrderedDict()
+            for package, operator, version in options:
+                if operator:
+                    version = self.apply_operator(
+                        versions.get(package, ''), operator, version)
+                    if not version:
+                        versions.pop(package, None)
+                        continue
+                versions[package] = version
+
+        merged[path] = versions
+        return versions
+
+    def apply_operator(self, current, operator, value):
+        """
+        Returns the value of an option whose lines are added
+        by the + operator or removed by the - operator.
+        """
+        lines = [line for line in current.split('\n') if line]
+        values = [line for line in value.split('\n') if line]
+        if operator == '+':
+            return '\n'.join(lines + values)
+        return '\n'.join(line for line in lines if line not in values)
@@ -0,0 +1,85 @@
+"""Parsing processes for Buildout Versions Checker"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent import futures
+
+from bvc.releases import sort_releases
+
+
+def parse_releases(parser_class, package, content):
+    """
+    Parses the releases of a package in a response
+    and returns them sorted.
+    """
+    parser = parser_class(package)
+    parser.feed(content)
+    return sort_releases(parser.close())
+
+
+class ParsingPool(object):
+    """
+    Processes parsing the responses downloaded by the threads,
+    holding them while the responses waiting for a process
+    have reached the bound.
+    """
+
+    def __init__(self, processes, bound=None):
+        self.executor = futures.ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'))
+        self.slots = self.semaphore(bound or 2 * processes)
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def semaphore(self, value):
+        return threading.BoundedSemaphore(value)
+
+    def submit(self, parser_class, package, content):
+        """
+        Submits the parsing of a response to the processes.
+        """
+        future = self.executor.submit(
+            parse_releases, parser_class, package, content)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def parse(self, parser_class, package, content):
+        """
+        Waits for a free slot and returns the sorted
+        releases of a response parsed by a process.
+        """
+        with self.slots:
+            return self.submit(parser_class, package, content).result()
+
+    def close(self):
+        """
+        Cancels the parsings not started and stops the processes.
+        """
+        with self.lock:
+            pending = list(self.pending)
+        for future in pending:
+            future.cancel()
+        self.executor.shutdown()
+
+
+class AsyncParsingPool(ParsingPool):
+    """
+    Processes parsing the responses downloaded by the tasks,
+    holding them while the responses waiting for a process
+    have reached the bound.
+    """
+
+    def semaphore(self, value):
+        return asyncio.BoundedSemaphore(value)
+
+    async def parse(self, parser_class, package, content):
+        async with self.slots:
+            return await asyncio.wrap_future(
+                self.submit(parser_class, package, content))
@@ -0,0 +1,273 @@
+"""Releases parsers for Buildout Versions Checker"""
+import codecs
+import json
+import re
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion
+from packaging.version import Version
+
+SIMPLE_JSON = 'application/vnd.pypi.simple.v1+json'
+
+SIMPLE_ACCEPT = ', '.join([
+    SIMPLE_JSON,
+    'application/vnd.pypi.simple.v1+html;q=0.2',
+    'text/html;q=0.01'
+])
+
+ARCHIVE_EXTENSIONS = ('.tar.gz', '.tar.bz2', '.tar.xz',
+                      '.tgz', '.tar', '.zip')
+
+JSON_STRUCTURE = re.compile(r'["{}\[\]:,]')
+
+JSON_STRING_PART = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+
+
+def filename_version(filename, package):
+    """
+    Extracts the version from the filename of
+    a distribution of a package, or returns None.
+    """
+    if filename.endswith(('.whl', '.egg')):
+        parts = filename[:-4].split('-')
+        if len(parts) < 2:
+            return None
+        return parts[1]
+
+    for extension in ARCHIVE_EXTENSIONS:
+        if filename.endswith(extension):
+            stem = filename[:-len(extension)]
+            break
+    else:
+        return None
+
+    package = canonicalize_name(package)
+    position = stem.find('-')
+    while position > 0:
+        if canonicalize_name(stem[:position]) == package:
+            return stem[position + 1:] or None
+        position = stem.find('-', position + 1)
+
+    return None
+
+
+def sort_releases(releases):
+    """
+    Returns the releases having a valid version,
+    sorted from the first to the last version.
+    """
+    versions = []
+    for release in releases:
+        try:
+            versions.append((Version(release), release))
+        except InvalidVersion:
+            continue
+    versions.sort()
+
+    return [release for version, release in versions]
+
+
+def parse_simple_json_releases(content, package):
+    """
+    Returns the releases listed in a project page of
+    the JSON Simple API, or found in its filenames.
+    """
+    results = json.loads(content)
+    if 'versions' in results:
+        return results['versions']
+
+    releases = set()
+    for distribution in results['files']:
+        version = filename_version(distribution['filename'], package)
+        if version:
+            releases.add(version)
+
+    return list(releases)
+
+
+class ReleasesParser(object):
+    """
+    Parser fed with the chunks of a response,
+    decoding them incrementally.
+    """
+    errors = 'strict'
+
+    def __init__(self, package):
+        self.package = package
+        self.decoder = codecs.getincrementaldecoder('utf-8')(self.errors)
+
+    def feed(self, data):
+        """
+        Parses a chunk of the response.
+        """
+        self.feed_text(self.decoder.decode(data))
+
+    def close(self):
+        """
+        Ends the parsing and returns the releases found.
+        """
+        self.feed_text(self.decoder.decode(b'', True))
+        return self.releases()
+
+    def feed_text(self, text):
+        raise NotImplementedError
+
+    def releases(self):
+        raise NotImplementedError
+
+
+class JSONReleasesParser(ReleasesParser):
+    """
+    Streaming parser of a document of the JSON API of Pypi,
+    only the versions of the releases are kept in memory.
+    """
+
+    def __init__(self, package):
+        super(JSONReleasesParser, self).__init__(package)
+        self.stack = []
+        self.expect_key = False
+        self.in_releases = False
+        self.found = False
+        self.key = None
+        self.string = None
+        self.pending = ''
+        self.versions = []
+
+    def feed_text(self, text):
+        text = self.pending + text
+        self.pending = ''
+        position = 0
+        length = len(text)
+
+        while position < length:
+            if self.string is not None:
+                end = JSON_STRING_PART.match(text, position).end()
+                if self.string is not False:
+                    self.string.append(text[position:end])
+                if end == length:
+                    break
+                if text[end] == '\\':
+                    # Escape sequence split between two chunks.
+                    self.pending = text[end:]
+                    break
+                self.end_string()
+                position = end + 1
+                continue
+
+            match = JSON_STRUCTURE.search(text, position)
+            if match is None:
+                break
+            position = match.end()
+            self.structure(match.group())
+
+    def structure(self, character):
+        """
+        Follows the structure of the document
+        for a structural character.
+        """
+        if character == '"':
+            if len(self.stack) == 2 and self.in_releases:
+                collect = self.expect_key or self.stack[-1] == '['
+            else:
+                collect = self.expect_key and len(self.stack) == 1
+            self.string = False
+            if collect:
+                self.string = []
+        elif character in '{[':
+            self.stack.append(character)
+            self.expect_key = character == '{'
+            if len(self.stack) == 2 and self.key == 'releases':
+                self.in_releases = self.found = True
+        elif character in '}]':
+            if not self.stack:
+                raise ValueError('Invalid JSON document')
+            self.stack.pop()
+            self.expect_key = False
+            if len(self.stack) == 1:
+                self.in_releases = False
+                self.key = None
+        elif character == ':':
+            self.expect_key = False
+        elif self.stack and self.stack[-1] == '{':
+            self.expect_key = True
+
+    def end_string(self):
+        """
+        Handles the end of the current string.
+        """
+        parts, self.string = self.string, None
+        if parts is False:
+            return
+        value = json.loads('"%s"' % ''.join(parts))
+        if len(self.stack) == 1:
+            self.key = value
+        else:
+            self.versions.append(value)
+
+    def releases(self):
+        if self.stack or self.string is not None:
+            raise ValueError('Truncated JSON document')
+        if not self.found:
+            raise ValueError('No releases found for %s' % self.package)
+        return self.versions
+
+
+class SimpleJSONReleasesParser(ReleasesParser):
+    """
+    Parser of a project page of the JSON Simple API.
+    """
+
+    def __init__(self, package):
+        super(SimpleJSONReleasesParser, self).__init__(package)
+        self.texts = []
+
+    def feed_text(self, text):
+        self.texts.append(text)
+
+    def releases(self):
+        return parse_simple_json_releases(
+            ''.join(self.texts), self.package)
+
+
+class AnchorsParser(HTMLParser):
+    """
+    HTML parser collecting the versions of the
+    distributions linked by the anchors.
+    """
+
+    def __init__(self, package):
+        super(AnchorsParser, self).__init__()
+        self.package = package
+        self.versions = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        for name, value in attrs:
+            if name == 'href' and value:
+                filename = unquote(urlsplit(value).path.rsplit('/', 1)[-1])
+                version = filename_version(filename, self.package)
+                if version:
+                    self.versions.add(version)
+
+
+class SimpleHTMLReleasesParser(ReleasesParser):
+    """
+    Streaming parser of a project page of the HTML Simple API,
+    only the pending markup is kept in memory.
+    """
+    errors = 'replace'
+
+    def __init__(self, package):
+        super(SimpleHTMLReleasesParser, self).__init__(package)
+        self.parser = AnchorsParser(package)
+
+    def feed_text(self, text):
+        self.parser.feed(text)
+
+    def releases(self):
+        self.parser.close()
+        return list(self.parser.versions)
@@ -0,0 +1,205 @@
+"""Retries, hedged and raced requests for Buildout Versions Checker"""
+import random
+import threading
+from collections import deque
+from urllib.error import HTTPError
+from urllib.error import URLError
+
+from bvc.transport import ConnectError
+
+RETRY_CODES = (429, 500, 502, 503, 504)
+
+
+def retryable(error):
+    """
+    Checks if a failed request is worth retrying.
+    """
+    if isinstance(error, HTTPError):
+        return error.code in RETRY_CODES
+    return isinstance(error, URLError)
+
+
+def retry_after(error):
+    """
+    Returns the delay in seconds asked by the Retry-After
+    header of an HTTP error, or None.
+    """
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        return None
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt, base=0.5, cap=10.0):
+    """
+    Returns a random delay before retrying,
+    its bound growing exponentially with the attempts.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class Hedging(object):
+    """
+    Tracks the latencies of the last requests, to send a duplicate
+    of the requests slower than most of them, within a budget.
+    """
+
+    def __init__(self, quantile=0.95, budget=0.1,
+                 window=100, minimum=20):
+        self.quantile = quantile
+        self.budget = budget
+        self.latencies = deque(maxlen=window)
+        self.minimum = minimum
+        self.requests = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency):
+        """
+        Records the latency of a successful request.
+        """
+        with self.lock:
+            self.latencies.append(latency)
+            self.requests += 1
+
+    def delay(self):
+        """
+        Returns the delay before hedging a request,
+        or None while too few latencies are known.
+        """
+        with self.lock:
+            if len(self.latencies) < self.minimum:
+                return None
+            latencies = sorted(self.latencies)
+        return latencies[int(self.quantile * (len(latencies) - 1))]
+
+    def spend(self):
+        """
+        Checks if a request can be hedged within
+        the budget of duplicate requests.
+        """
+        with self.lock:
+            if self.hedges >= self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+
+class Ranking(object):
+    """
+    Tracks the smoothed latencies of several indexes,
+    to request them from the fastest one, racing the next
+    one within a budget of duplicate requests.
+    """
+    smoothing = 0.3
+    patience = 2.0
+    default = 1.0
+    minimum = 0.1
+
+    def __init__(self, urls, budget=0.1):
+        self.urls = list(urls)
+        self.latencies = {}
+        self.budget = budget
+        self.requests = 0
+        self.races = 0
+        self.lock = threading.Lock()
+
+    def record(self, url, latency):
+        """
+        Records the latency of a successful request on an index.
+        """
+        with self.lock:
+            smoothed = self.latencies.get(url, latency)
+            self.latencies[url] = smoothed + self.smoothing * (
+                latency - smoothed)
+            self.requests += 1
+
+    def failed(self, url, latency):
+        """
+        Records a failed request on an index,
+        as slow as the default delay at least.
+        """
+        with self.lock:
+            self.latencies[url] = max(latency, self.default,
+                                      self.latencies.get(url, 0))
+
+    def ranked(self):
+        """
+        Returns the indexes from the fastest,
+        the ones never measured being the last.
+        """
+        with self.lock:
+            return sorted(self.urls, key=lambda url: (
+                url not in self.latencies,
+                self.latencies.get(url, 0)))
+
+    def stagger(self, url):
+        """
+        Returns the delay before requesting the next index
+        when an index has not answered.
+        """
+        with self.lock:
+            latency = self.latencies.get(url)
+        if latency is None:
+            return self.default
+        return max(self.minimum, min(self.default, self.patience * latency))
+
+    def spend(self):
+        """
+        Checks if the next index can be raced within the budget
+        of duplicate requests, the first race being allowed.
+        """
+        with self.lock:
+            if self.races > self.budget * self.requests:
+                return False
+            self.races += 1
+            return True
+
+
+class CircuitOpen(Exception):
+    """
+    Raised when requesting an index which has failed
+    too many times in a row.
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Counts the consecutive packages failing to connect to an index,
+    to stop requesting it beyond a threshold.
+    """
+
+    def __init__(self, url, threshold=5):
+        self.url = url
+        self.threshold = threshold
+        self.failures = 0
+        self.failed = set()
+        self.error = None
+        self.lock = threading.Lock()
+
+    def check(self):
+        """
+        Raises CircuitOpen if the index has failed too many times.
+        """
+        if self.threshold and self.failures >= self.threshold:
+            raise CircuitOpen(
+                '%s is unavailable, %d packages failed in a row: %s' % (
+                    self.url, self.failures, self.error.reason))
+
+    def record(self, error=None, package=None):
+        """
+        Records the outcome of a request, only the errors opening
+        a connection being failures, once per package: an index
+        answering, even slowly or with an error, is available.
+        """
+        with self.lock:
+            if not isinstance(error, ConnectError):
+                self.failures = 0
+                self.failed.clear()
+            elif package not in self.failed:
+                self.failed.add(package)
+                self.failures += 1
+                self.error = error
@@ -4,6 +4,7 @@ import sys
 from argparse import Action
 from argparse import ArgumentError
 from argparse import ArgumentParser
+from argparse import ArgumentTypeError
 from argparse import _copy_items
 
 from bvc.checker import VersionsChecker
@@ -13,15 +14,19 @@ from bvc.logger import logger
 
 
 class StoreSpecifiers(Action):
+    separator = ':'
+    maxsplit = -1
+    value_type = str
 
     def __call__(self, parser, namespace, values, option_string=None):
         items = getattr(namespace, self.dest, None)
         items = _copy_items(items)
 
         try:
-            key, value = values.split(':')
+            key, value = values.split(self.separator, self.maxsplit)
         except ValueError:
-            raise ArgumentError(self, 'key:value syntax not followed')
+            raise ArgumentError(
+                self, 'key%svalue syntax not followed' % self.separator)
 
         key = key.strip()
         value = value.strip()
@@ -29,10 +34,43 @@ class StoreSpecifiers(Action):
         if not key or not value:
             raise ArgumentError(self, 'key or value are empty')
 
+        try:
+            value = self.value_type(value)
+        except ValueError:
+            raise ArgumentError(self, 'invalid value: %s' % value)
+
         items.update({key: value})
         setattr(namespace, self.dest, items)
 
 
+class StoreRoutes(StoreSpecifiers):
+    separator = '='
+    maxsplit = 1
+
+
+class StoreHostLimits(StoreSpecifiers):
+    separator = '='
+    value_type = int
+
+
+def concurrency(value):
+    if value == 'auto':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise ArgumentTypeError("invalid int value or 'auto': '%s'" % value)
+
+
+def log_update(package, version, current_version, indentation):
+    logger.warning(
+        '%s= %s %s',
+        package.ljust(indentation),
+        version,
+        ('#  %s' % current_version).rjust(15)
+    )
+
+
 def cmdline(argv=sys.argv[1:]):
     parser = ArgumentParser(
         description='Check availables updates from a '
@@ -98,6 +136,15 @@ def cmdline(argv=sys.argv[1:]):
         default=-1,
         help='Spaces used when indenting "key = value" (default: auto)'
     )
+    file_group.add_argument(
+        '--progressive',
+        action='store_true',
+        dest='progressive',
+        default=False,
+        help='Print the updates as soon as they are found '
+        '(by default they are printed at the end, sorted as in '
+        'the source file)'
+    )
     file_group.add_argument(
         '--sorting',
         dest='sorting',
@@ -111,23 +158,177 @@ def cmdline(argv=sys.argv[1:]):
     network_group.add_argument(
         '--service-url',
         dest='service_url',
-        default='https://pypi.python.org/pypi',
-        help='The service to use for checking the packages '
-        '(default: https://pypi.python.org/pypi)'
+        action='append',
+        default=None,
+        help='The service to use for checking the packages, repeat it '
+        'to race the mirrors of the index for each package '
+        '(default: https://pypi.python.org/pypi, '
+        'or https://pypi.org/simple with the simple API)'
+    )
+    network_group.add_argument(
+        '--route',
+        action=StoreRoutes,
+        dest='routes',
+        default={},
+        help='Check the packages matching a pattern on another service. '
+        'Example "company.*=https://pypi.company.com/pypi" '
+        '(can be used multiple times)'
+    )
+    network_group.add_argument(
+        '--api',
+        dest='api',
+        default='json',
+        choices=['json', 'simple'],
+        help='API of the service listing the releases, '
+        'simple is the Simple API, in JSON or in HTML for the '
+        'private indexes (default: json)'
     )
     network_group.add_argument(
         '--timeout',
         dest='timeout',
         type=int,
         default=10,
-        help='Timeout for each request (default: 10s)'
+        help='Time allowed for fetching the releases '
+        'of each package, retries included (default: 10s)'
+    )
+    network_group.add_argument(
+        '--deadline',
+        dest='deadline',
+        type=int,
+        default=None,
+        help='Time allowed for checking all the packages, the updates '
+        'found in time are reported with the packages not checked '
+        '(default: no limit)'
+    )
+    network_group.add_argument(
+        '--connect-timeout',
+        dest='connect_timeout',
+        type=int,
+        default=None,
+        help='Timeout for opening a connection (default: the timeout)'
+    )
+    network_group.add_argument(
+        '--read-timeout',
+        dest='read_timeout',
+        type=int,
+        default=None,
+        help='Timeout for each read on a connection (default: the timeout)'
+    )
+    network_group.add_argument(
+        '--retries',
+        dest='retries',
+        type=int,
+        default=2,
+        help='Retries of the requests failing because of the network '
+        'or of an unavailable service, after a random delay '
+        'growing exponentially (default: 2)'
+    )
+    network_group.add_argument(
+        '--max-failures',
+        dest='max_failures',
+        type=int,
+        default=5,
+        help='Consecutive packages failing to connect to an index '
+        'after which it is not requested anymore, the checking being '
+        'aborted without another index, 0 never stops (default: 5)'
+    )
+    network_group.add_argument(
+        '--hedge',
+        dest='hedge',
+        action='store_true',
+        help='Send a duplicate of the requests slower than 95%% of '
+        'the previous ones and use the first response (by default '
+        'the requests are not hedged)'
     )
     network_group.add_argument(
         '-t', '--threads',
         dest='threads',
-        type=int,
+        type=concurrency,
         default=10,
-        help='Threads used for checking the versions in parallel'
+        help='Threads used for checking the versions in parallel, '
+        'auto adapts their number to the load of the service '
+        '(default: 10)'
+    )
+    network_group.add_argument(
+        '--host-limit',
+        action=StoreHostLimits,
+        dest='host_limits',
+        default={},
+        help='Limit the concurrent requests on a host, sent by their '
+        'own threads. Example "pypi.company.com=2" '
+        '(can be used multiple times)'
+    )
+    network_group.add_argument(
+        '--rate',
+        dest='rate',
+        type=float,
+        default=None,
+        help='Maximum requests sent per second (default: no limit)'
+    )
+    network_group.add_argument(
+        '--rate-file',
+        dest='rate_file',
+        default=None,
+        help='File sharing the rate limit between the processes '
+        'checking at the same time (default: not shared)'
+    )
+    network_group.add_argument(
+        '--engine',
+        dest='engine',
+        default='threads',
+        choices=['threads', 'asyncio'],
+        help='Engine used for checking the versions in parallel, '
+        'with asyncio the threads are the concurrent requests '
+        '(default: threads)'
+    )
+    network_group.add_argument(
+        '--processes',
+        dest='processes',
+        type=int,
+        default=0,
+        help='Processes parsing the releases once downloaded, '
+        'for using several CPUs with many threads '
+        '(default: 0, parsed while downloaded)'
+    )
+
+    cache_group = parser.add_argument_group('Cache')
+    cache_group.add_argument(
+        '--cache-dir',
+        dest='cache_dir',
+        default=None,
+        help='Directory where the releases are cached and revalidated '
+        'on the next runs (default: no cache)'
+    )
+    cache_group.add_argument(
+        '--max-age',
+        dest='max_age',
+        type=int,
+        default=0,
+        help='Age under which the cached releases are used '
+        'without revalidation (default: 0s)'
+    )
+    cache_group.add_argument(
+        '--cache-size',
+        dest='cache_size',
+        type=int,
+        default=10000,
+        help='Maximum number of packages kept in the cache, '
+        'the least recently used are evicted (default: 10000)'
+    )
+    cache_group.add_argument(
+        '--unknown-max-age',
+        dest='unknown_max_age',
+        type=int,
+        default=86400,
+        help='Age under which the packages unknown by the service '
+        'are not checked again (default: 86400s)'
+    )
+    cache_group.add_argument(
+        '--include-unknown',
+        dest='include_unknown',
+        action='store_true',
+        help='Check again the packages cached as unknown by the service '
+        '(by default they are skipped)'
     )
 
     verbosity_group = parser.add_argument_group('Verbosity')
@@ -171,28 +372,55 @@ def cmdline(argv=sys.argv[1:]):
             options.excludes,
             options.service_url,
             options.timeout,
-            options.threads
+            options.threads,
+            engine=options.engine,
+            cache_dir=options.cache_dir,
+            max_age=options.max_age,
+            cache_size=options.cache_size,
+            api=options.api,
+            connect_timeout=options.connect_timeout,
+            read_timeout=options.read_timeout,
+            retries=options.retries,
+            hedge=options.hedge,
+            unknown_max_age=options.unknown_max_age,
+            include_unknown=options.include_unknown,
+            routes=options.routes,
+            host_limits=options.host_limits,
+            rate=options.rate,
+            rate_file=options.rate_file,
+            max_failures=options.max_failures,
+            deadline=options.deadline,
+            processes=options.processes,
+            lazy=options.progressive
         )
+        if options.progressive:
+            indentation = options.indentation
+            for i, (package, current_version, version) in enumerate(
+                    checker.iter_updates()):
+                if not i:
+                    if indentation < 0:
+                        indentation = perfect_indentation(
+                            checker.versions.keys()
+                        )
+                    logger.warning('[versions]')
+                log_update(package, version, current_version, indentation)
     except Exception as e:
         sys.exit(str(e))
 
     if not checker.updates:
         sys.exit(0)
 
-    indentation = options.indentation
-    if indentation < 0:
-        indentation = perfect_indentation(
-            checker.updates.keys()
-        )
+    if not options.progressive:
+        indentation = options.indentation
+        if indentation < 0:
+            indentation = perfect_indentation(
+                checker.updates.keys()
+            )
 
-    logger.warning('[versions]')
-    for package, version in checker.updates.items():
-        logger.warning(
-            '%s= %s %s',
-            package.ljust(indentation),
-            version,
-            ('#  %s' % checker.versions[package]).rjust(15)
-        )
+        logger.warning('[versions]')
+        for package, version in checker.updates.items():
+            log_update(package, version,
+                       checker.versions[package], indentation)
 
     if options.write:
         config = VersionsConfigParser(
@@ -205,6 +433,9 @@ def cmdline(argv=sys.argv[1:]):
             config.add_section('versions')
 
         for package, version in checker.updates.items():
+            if (package in checker.source_versions and
+                    not config.has_option('versions', package)):
+                continue
             config.set('versions', package, version)
 
         config.write(source)
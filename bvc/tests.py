@@ -1,25 +1,79 @@
 """Tests for Buildout version checker"""
+import asyncio
+import hashlib
 import json
 import os
+import socket
 import sys
+import time
+import zlib
+from argparse import ArgumentParser
 from collections import OrderedDict
+from concurrent import futures
+from configparser import DuplicateOptionError
+from configparser import DuplicateSectionError
+from configparser import MissingSectionHeaderError
+from configparser import NoSectionError
+from configparser import ParsingError
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 from io import BytesIO
 from io import StringIO
 from logging import Handler
 from tempfile import NamedTemporaryFile
+from tempfile import TemporaryDirectory
+from threading import Lock
+from threading import Thread
 from unittest import TestCase
 from unittest import TestLoader
 from unittest import TestSuite
+from urllib.error import HTTPError
 from urllib.error import URLError
 
 from bvc import checker
+from bvc.aio import AsyncHTTPTransport
+from bvc.cache import ReleasesCache
 from bvc.checker import UnusedVersionsChecker
 from bvc.checker import VersionsChecker
 from bvc.configparser import VersionsConfigParser
+from bvc.configparser import iter_section_options
+from bvc.extends import ExtendsResolver
 from bvc.logger import logger
+from bvc.parsing import ParsingPool
+from bvc.parsing import parse_releases
+from bvc.releases import JSONReleasesParser
+from bvc.releases import SIMPLE_ACCEPT
+from bvc.releases import SIMPLE_JSON
+from bvc.releases import SimpleHTMLReleasesParser
+from bvc.releases import filename_version
+from bvc.releases import parse_simple_json_releases
+from bvc.releases import sort_releases
+from bvc.retry import CircuitBreaker
+from bvc.retry import CircuitOpen
+from bvc.retry import Hedging
+from bvc.retry import Ranking
+from bvc.retry import backoff
+from bvc.retry import retry_after
+from bvc.retry import retryable
 from bvc.scripts import check_buildout_updates
 from bvc.scripts import find_unused_versions
 from bvc.scripts import indent_buildout
+from bvc.scripts.check_buildout_updates import StoreRoutes
+from bvc.throttle import AdaptiveLimit
+from bvc.throttle import AsyncThrottle
+from bvc.throttle import Limit
+from bvc.throttle import Throttle
+from bvc.throttle import TokenBucket
+from bvc.transport import ConnectError
+from bvc.transport import Deadline
+from bvc.transport import HTTPTransport
+from bvc.transport import Response
+from bvc.versions import clear
+from bvc.versions import hit_rates
+from bvc.versions import parse_version
+from bvc.versions import specifier_set
+
+from packaging.specifiers import SpecifierSet
 
 
 class LazyVersionsChecker(VersionsChecker):
@@ -63,14 +117,197 @@ class URLOpener(object):
         try:
             json_payload = json.dumps(self.results[package])
         except KeyError:
-            raise URLError('404')
+            raise HTTPError(url, 404, 'Not Found', {}, None)
 
-        return BytesIO(bytes(json_payload, 'utf-8'))
+        return Response(url, 200, 'OK', {},
+                        BytesIO(bytes(json_payload, 'utf-8')))
+
+
+class FakeTransport(object):
+    """
+    Fake HTTPTransport opening the URLs with URLOpener.
+    """
+
+    def __init__(self, timeout=10, connect_timeout=None, read_timeout=None):
+        self.timeout = timeout
+        self.opener = URLOpener()
+        self.connections = 0
+        self.requests = 0
+
+    def urlopen(self, url, headers={}, deadline=None):
+        self.connections = 1
+        self.requests += 1
+        return self.opener(url)
+
+    def close(self):
+        pass
+
+
+class IndexHandler(BaseHTTPRequestHandler):
+    """
+    Request handler serving the URLOpener results
+    with persistent connections.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # noqa
+        if self.path.startswith('/busy/'):
+            with self.server.lock:
+                self.server.in_flight += 1
+                busy = self.server.in_flight > self.server.capacity
+            time.sleep(self.server.delay)
+            with self.server.lock:
+                self.server.in_flight -= 1
+            if busy:
+                self.server.statuses.append(503)
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+        if self.path.startswith('/flaky/'):
+            with self.server.lock:
+                failures = self.server.failures.get(self.path, 0)
+                self.server.failures[self.path] = failures + 1
+            if failures < self.server.max_failures:
+                self.server.statuses.append(503)
+                self.send_response(503)
+                self.send_header('Retry-After', self.server.retry_after)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+        if self.path.startswith('/moved/'):
+            self.send_response(301)
+            self.send_header('Location', self.path[6:])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        status = 200
+        package = self.path.split('/')[-2]
+        content_type = 'application/json'
+        try:
+            results = URLOpener.results[package]
+            if '/html/' in self.path:
+                content_type = 'text/html'
+                results = ''.join(
+                    '<a href="../../packages/%s-%s.tar.gz#sha256=abc">'
+                    '%s-%s.tar.gz</a><br/>\n' % (
+                        package, version, package, version)
+                    for version in results['releases'])
+                results = '<html><body>%s</body></html>' % results
+            elif '/simple/' in self.path:
+                content_type = SIMPLE_JSON
+                results = {
+                    'meta': {'api-version': '1.0'},
+                    'name': package,
+                    'files': [
+                        {'filename': '%s-%s.tar.gz' % (package, version)}
+                        for version in results['releases']] + [
+                        {'filename': '%s-%s-py3-none-any.whl' % (
+                            package.replace('-', '_'), version)}
+                        for version in results['releases']]
+                }
+            if not isinstance(results, str):
+                results = json.dumps(results)
+            payload = results
+        except KeyError:
+            status, payload = 404, 'Not Found'
+
+        etag = '"%s"' % hashlib.sha1(payload.encode('utf-8')).hexdigest()
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            status, payload = 304, ''
+
+        self.server.statuses.append(status)
+        self.server.encodings.append(self.headers.get('Accept-Encoding'))
+        payload = payload.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        if self.server.encoding and self.server.encoding in self.headers.get(
+                'Accept-Encoding', ''):
+            compressor = zlib.compressobj(wbits=self.server.wbits)
+            payload = compressor.compress(payload) + compressor.flush()
+            self.send_header('Content-Encoding', self.server.encoding)
+        if self.path.startswith('/chunked/'):
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(payload), 4):
+                chunk = payload[i:i + 4]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.path.startswith('/slow/'):
+            try:
+                for i in range(0, len(payload), 4):
+                    time.sleep(self.server.delay)
+                    self.wfile.write(payload[i:i + 4])
+                    self.wfile.flush()
+            except OSError:
+                pass
+            return
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalIndexServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server accepting many concurrent connections.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+    delay = 0.05
+    capacity = 4
+    max_failures = 1
+    retry_after = '0'
+    encoding = None
+    wbits = zlib.MAX_WBITS
+
+    def __init__(self, *ka, **kw):
+        self.statuses = []
+        self.encodings = []
+        self.failures = {}
+        self.in_flight = 0
+        self.lock = Lock()
+        super(LocalIndexServer, self).__init__(*ka, **kw)
+
+
+class LocalIndexTestCase(TestCase):
+    """
+    TestCase running a local stand-in index.
+    """
+
+    def setUp(self):
+        self.environ = os.environ.copy()
+        for key in list(os.environ):
+            if key.lower().endswith('_proxy'):
+                del os.environ[key]
+        self.server = LocalIndexServer(('127.0.0.1', 0), IndexHandler)
+        self.thread = Thread(target=self.server.serve_forever,
+                             kwargs={'poll_interval': 0.01})
+        self.thread.start()
+        self.service_url = 'http://127.0.0.1:%s/pypi' % (
+            self.server.server_port)
+        super(LocalIndexTestCase, self).setUp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        os.environ.clear()
+        os.environ.update(self.environ)
+        super(LocalIndexTestCase, self).tearDown()
 
 
 class StubbedURLOpenTestCase(TestCase):
     """
-    TestCase enabling a stub around the urllib2.urlopen
+    TestCase enabling a stub around the HTTPTransport
     used by VersionsChecker.
     """
 
@@ -84,16 +321,16 @@ class StubbedURLOpenTestCase(TestCase):
 
     def stub_url_open(self):
         """
-        Replace the urlopen used in bvc.
+        Replace the HTTPTransport used in bvc.
         """
-        self.original_url_open = checker.urlopen
-        checker.urlopen = URLOpener()
+        self.original_transport = checker.HTTPTransport
+        checker.HTTPTransport = FakeTransport
 
     def unstub_url_open(self):
         """
-        Restaure the original urlopen function.
+        Restaure the original HTTPTransport class.
         """
-        checker.urlopen = self.original_url_open
+        checker.HTTPTransport = self.original_transport
 
 
 class StubbedListDirTestCase(TestCase):
@@ -217,7 +454,14 @@ class VersionsCheckerTestCase(StubbedURLOpenTestCase):
         config_file.seek(0)
         self.assertEquals(self.checker.parse_versions(config_file.name),
                           [('egg', '0.1'), ('Egg', '0.2')])
+        config_file.seek(0)
+        config_file.write('[versions]\negg+=0.1\nEgg -= 0.2'.encode('utf-8'))
+        config_file.seek(0)
+        self.assertEquals(self.checker.parse_versions(config_file.name),
+                          [('egg', '0.1')])
         config_file.close()
+        self.assertEquals(self.checker.parse_versions(config_file.name),
+                          [])
 
     def test_include_exclude_versions(self):
         source_versions = OrderedDict([('egg', '0.1'), ('Egg', '0.2')])
@@ -263,24 +507,24 @@ class VersionsCheckerTestCase(StubbedURLOpenTestCase):
             self.checker.fetch_last_versions(
                 [('egg', ''), ('UnknowEgg', '')], False,
                 'service_url', 1, 1),
-            [('egg', '0.3'), ('UnknowEgg', '0.0.0')])
+            [('egg', '0.3'), ('UnknowEgg', None)])
         self.assertEquals(
             self.checker.fetch_last_versions(
                 [('egg', '<=0.2'), ('UnknowEgg', '>1.0')], False,
                 'service_url', 1, 1),
-            [('egg', '0.2'), ('UnknowEgg', '0.0.0')])
+            [('egg', '0.2'), ('UnknowEgg', None)])
         results = self.checker.fetch_last_versions(
             [('egg', ''), ('UnknowEgg', '')], False,
             'service_url', 1, 2)
         self.assertEquals(
             dict(results),
-            dict([('egg', '0.3'), ('UnknowEgg', '0.0.0')]))
+            dict([('egg', '0.3'), ('UnknowEgg', None)]))
 
     def test_fetch_last_version(self):
         self.assertEquals(
             self.checker.fetch_last_version(
                 ('UnknowEgg', ''), False, 'service_url', 1),
-            ('UnknowEgg', '0.0.0')
+            ('UnknowEgg', None)
         )
         self.assertEquals(
             self.checker.fetch_last_version(
@@ -293,6 +537,21 @@ class VersionsCheckerTestCase(StubbedURLOpenTestCase):
             ('egg', '0.2')
         )
 
+    def test_route(self):
+        self.checker.routes = {'company.*': 'http://company.com:8080/pypi',
+                               'Other_Egg': 'http://other.com/pypi'}
+        self.assertEquals(
+            self.checker.route('Company.Egg', 'service_url'),
+            'http://company.com:8080/pypi')
+        self.assertEquals(
+            self.checker.route('other-egg', 'service_url'),
+            'http://other.com/pypi')
+        self.assertEquals(
+            self.checker.route('egg', 'service_url'), 'service_url')
+        self.assertEquals(
+            self.checker.route_host('company-egg', 'service_url'),
+            'company.com:8080')
+
     def test_fetch_last_version_with_prereleases(self):
         self.assertEquals(
             self.checker.fetch_last_version(
@@ -315,12 +574,1486 @@ class VersionsCheckerTestCase(StubbedURLOpenTestCase):
             ('egg-dev', '1.1b1')
         )
 
+    def test_select_last_version(self):
+        releases = ['0.1', '0.9', '1.0', '1.1b1', '2.0']
+        for specifier, allow_pre_releases, version in [
+                ('', False, '2.0'), ('<2.0', False, '1.0'),
+                ('<2.0', True, '1.1b1'), ('<0.1', False, '0.0.0'),
+                ('>2.0', False, '0.0.0')]:
+            self.assertEquals(
+                self.checker.select_last_version(
+                    'egg', SpecifierSet(specifier, allow_pre_releases),
+                    releases),
+                ('egg', version))
+        self.assertEquals(
+            self.checker.select_last_version('egg', SpecifierSet(), None),
+            ('egg', None))
+
     def test_find_updates(self):
         versions = OrderedDict([('egg', '1.5.1'), ('Egg', '0.0.0')])
         last_versions = OrderedDict([('egg', '1.5.1'), ('Egg', '1.0')])
         self.assertEquals(self.checker.find_updates(
             versions, last_versions), [('Egg', '1.0')])
 
+    def test_find_updates_normalized(self):
+        versions = OrderedDict([('egg', '1.0-beta1'), ('Egg', 'invalid')])
+        last_versions = OrderedDict([('egg', '1.0b1'), ('Egg', '1.0')])
+        self.assertEquals(self.checker.find_updates(
+            versions, last_versions), [('Egg', '1.0')])
+
+    def test_find_updates_unchecked(self):
+        versions = OrderedDict([('egg', '1.5.1'), ('Egg', '0.0.0')])
+        last_versions = OrderedDict([('egg', None), ('Egg', '1.0')])
+        self.assertEquals(self.checker.find_updates(
+            versions, last_versions), [('Egg', '1.0')])
+
+
+class ResponseTestCase(TestCase):
+
+    def response(self, encoding, content, wbits):
+        compressor = zlib.compressobj(wbits=wbits)
+        return Response('url', 200, 'OK', {'Content-Encoding': encoding},
+                        BytesIO(compressor.compress(content) +
+                                compressor.flush()))
+
+    def test_decompress(self):
+        content = b'{"releases": {}}' * 100000
+        for encoding, wbits in (('gzip', 16 + zlib.MAX_WBITS),
+                                ('GZip', 16 + zlib.MAX_WBITS),
+                                ('deflate', zlib.MAX_WBITS),
+                                ('deflate', -zlib.MAX_WBITS)):
+            response = self.response(encoding, content, wbits)
+            response.chunk_size = 1024
+            pieces = list(response.iter_chunks())
+            self.assertEquals(b''.join(pieces), content)
+            self.assertEquals(max(len(piece) for piece in pieces), 1024)
+            self.assertTrue(response.consumed)
+
+    def test_identity(self):
+        response = Response('url', 200, 'OK', {'Content-Encoding': 'br'},
+                            BytesIO(b'content'))
+        self.assertEquals(response.read(), b'content')
+
+    def test_invalid_content(self):
+        response = Response('url', 200, 'OK', {'Content-Encoding': 'gzip'},
+                            BytesIO(b'{"releases": {}}'))
+        with self.assertRaises(URLError) as context:
+            response.read()
+        self.assertTrue(str(context.exception.reason).startswith(
+            'Invalid gzip content: Error -3'))
+
+
+class HTTPTransportTestCase(LogsTestCase,
+                            LocalIndexTestCase):
+
+    def setUp(self):
+        super(HTTPTransportTestCase, self).setUp()
+        self.transport = HTTPTransport(timeout=5)
+
+    def tearDown(self):
+        self.transport.close()
+        super(HTTPTransportTestCase, self).tearDown()
+
+    def test_urlopen(self):
+        self.assertEquals(
+            json.loads(self.transport.urlopen(
+                '%s/egg/json' % self.service_url).read().decode('utf-8')),
+            {'releases': ['0.3', '0.2']})
+
+    def test_urlopen_not_found(self):
+        with self.assertRaises(HTTPError) as context:
+            self.transport.urlopen('%s/unknow/json' % self.service_url)
+        self.assertEquals(context.exception.code, 404)
+
+    def test_urlopen_redirection(self):
+        self.assertEquals(
+            json.loads(self.transport.urlopen(
+                self.service_url.replace('/pypi', '/moved/pypi') +
+                '/egg/json').read().decode('utf-8')),
+            {'releases': ['0.3', '0.2']})
+        self.assertEquals(self.transport.requests, 2)
+        self.assertEquals(self.transport.connections, 1)
+
+    def test_urlopen_connection_error(self):
+        with self.assertRaises(URLError):
+            self.transport.urlopen('http://127.0.0.1:1/pypi/egg/json')
+
+    def test_persistent_connections(self):
+        for i in range(5):
+            self.transport.urlopen('%s/egg/json' % self.service_url).read()
+        with self.assertRaises(HTTPError):
+            self.transport.urlopen('%s/unknow/json' % self.service_url)
+        self.transport.urlopen('%s/egg-dev/json' % self.service_url).read()
+        self.assertEquals(self.transport.requests, 7)
+        self.assertEquals(self.transport.connections, 1)
+
+    def test_persistent_connections_threaded(self):
+        checker = LazyVersionsChecker()
+        self.assertEquals(
+            dict(checker.fetch_last_versions(
+                [('egg', '')] * 20 + [('egg-dev', '')] * 20, False,
+                self.service_url, 5, 4)),
+            {'egg': '0.3', 'egg-dev': '1.0'})
+        requests, connections = [
+            int(word) for word in self.logs.messages['info'][-1].split()
+            if word.isdigit()]
+        self.assertEquals(requests, 40)
+        self.assertTrue(connections <= 4)
+
+    def test_fetch_last_versions_timeout(self):
+        checker = LazyVersionsChecker(read_timeout=1, retries=0)
+        service_url = self.service_url.replace('/pypi', '/slow/pypi')
+        for engine in ('threads', 'asyncio'):
+            start = time.monotonic()
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', '')], False,
+                    service_url, 0.12, 2, engine)),
+                [('egg', None), ('egg-dev', None)])
+            self.assertTrue(time.monotonic() - start < 0.3)
+        self.assertEquals(
+            sorted(message for message in self.logs.messages['debug']
+                   if message.startswith('!>')),
+            ['!> %s/egg-dev/json timed out' % service_url] * 2 +
+            ['!> %s/egg/json timed out' % service_url] * 2)
+
+    def test_iter_last_versions(self):
+        checker = LazyVersionsChecker()
+        consumed = []
+
+        def packages():
+            for i in range(30):
+                consumed.append(i)
+                yield ('egg', '')
+
+        for engine in ('threads', 'asyncio'):
+            del consumed[:]
+            versions = checker.iter_last_versions(
+                packages(), False, self.service_url, 5, 2, engine)
+            self.assertEquals(next(versions), ('egg', '0.3'))
+            self.assertTrue(len(consumed) <= 5)
+            self.assertEquals(len(list(versions)), 29)
+            self.assertEquals(len(consumed), 30)
+
+            versions = checker.iter_last_versions(
+                packages(), False, self.service_url, 5, 2, engine)
+            next(versions)
+            versions.close()
+            self.assertEquals(checker.transport, None)
+            self.assertEquals(checker.run_deadline, None)
+
+    def test_fetch_last_versions_processes(self):
+        checker = LazyVersionsChecker(processes=2, api='simple')
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', ''), ('UnknowEgg', '')],
+                    False, self.service_url.replace('/pypi', '/simple'),
+                    5, 2, engine)),
+                [('UnknowEgg', None), ('egg', '0.3'),
+                 ('egg-dev', '1.0')])
+            self.assertEquals(checker.parsers, None)
+
+    def test_iter_updates(self):
+        checker = LazyVersionsChecker(
+            versions=OrderedDict([('egg', '0.3'), ('egg-dev', '0.0.0')]),
+            package_specifiers=[('egg', ''), ('egg-dev', '')],
+            allow_pre_releases=False, service_urls=self.service_url,
+            timeout=5, threads=1, engine='threads')
+        updates = checker.iter_updates()
+        self.assertEquals(next(updates), ('egg-dev', '0.0.0', '1.0'))
+        self.assertEquals(checker.last_versions, None)
+        self.assertEquals(list(updates), [])
+        self.assertEquals(checker.last_versions,
+                          {'egg': '0.3', 'egg-dev': '1.0'})
+        self.assertEquals(checker.updates, {'egg-dev': '1.0'})
+        self.assertEquals(self.logs.messages['info'][-1],
+                          '- 1 package updates found.')
+        checker.service_urls = 'http://localhost:1/pypi'
+        self.assertEquals(list(checker.iter_updates()),
+                          [('egg-dev', '0.0.0', '1.0')])
+
+    def test_stages(self):
+        config_file = NamedTemporaryFile()
+        config_file.write('[versions]\negg=0.3\negg-dev=0.0.0\n'.encode(
+            'utf-8'))
+        config_file.seek(0)
+        checker = VersionsChecker(
+            config_file.name, service_url=self.service_url,
+            threads=1, retries=0, lazy=True)
+        self.assertEquals(checker.versions, None)
+        self.assertEquals(checker.last_versions, None)
+        self.assertEquals(checker.updates, None)
+        self.assertEquals(checker.diff(), {'egg-dev': '1.0'})
+        self.assertEquals(checker.last_versions,
+                          {'egg': '0.3', 'egg-dev': '1.0'})
+
+        last_versions = checker.last_versions
+        checker.service_urls = ['http://localhost:1/pypi']
+        self.assertTrue(checker.fetch() is last_versions)
+        self.assertEquals(checker.fetch(refresh=True),
+                          {'egg': None, 'egg-dev': None})
+        self.assertEquals(checker.updates, None)
+        self.assertEquals(checker.diff(), {})
+
+        checker.service_urls = [self.service_url]
+        config_file.seek(0)
+        config_file.write('[versions]\negg=0.2\n'.encode('utf-8'))
+        config_file.truncate()
+        config_file.seek(0)
+        self.assertEquals(checker.parse(), {'egg': '0.3', 'egg-dev': '0.0.0'})
+        self.assertEquals(checker.parse(refresh=True), {'egg': '0.2'})
+        self.assertEquals(checker.last_versions, None)
+        self.assertEquals(checker.diff(), {'egg': '0.3'})
+        config_file.close()
+
+    def test_fetch_last_versions_deadline(self):
+        checker = LazyVersionsChecker(deadline=0.3, routes={
+            'egg-dev': self.service_url.replace('/pypi', '/slow/pypi')})
+        for engine, threads in (('threads', 2), ('threads', 1),
+                                ('asyncio', 2)):
+            start = time.monotonic()
+            self.assertEquals(
+                dict(checker.fetch_last_versions(
+                    [('egg', ''), ('UnknowEgg', ''), ('egg-dev', '')],
+                    False, self.service_url, 5, threads, engine)),
+                {'egg': '0.3', 'UnknowEgg': None, 'egg-dev': None})
+            self.assertTrue(time.monotonic() - start < 0.6)
+            self.assertEquals(self.logs.messages['warning'][-1],
+                              '- Deadline reached, 1 packages not checked.')
+
+    def test_fetch_last_versions_rate(self):
+        checker = LazyVersionsChecker(rate_limit=TokenBucket(50))
+        for engine in ('threads', 'asyncio'):
+            start = time.monotonic()
+            self.assertEquals(
+                dict(checker.fetch_last_versions(
+                    [('egg', '')] * 10, False,
+                    self.service_url, 5, 10, engine)),
+                {'egg': '0.3'})
+            self.assertTrue(time.monotonic() - start > 0.17)
+
+    def test_compressed_responses(self):
+        for encoding, wbits in (('gzip', 16 + zlib.MAX_WBITS),
+                                ('deflate', zlib.MAX_WBITS),
+                                ('deflate', -zlib.MAX_WBITS)):
+            self.server.encoding = encoding
+            self.server.wbits = wbits
+            for url in ('%s/egg/json', '%s/moved/pypi/egg/json'):
+                response = self.transport.urlopen(url % (
+                    self.service_url.replace('/pypi', '/chunked/pypi')))
+                self.assertEquals(response.getheader('Content-Encoding'),
+                                  encoding)
+                self.assertEquals(
+                    json.loads(response.read().decode('utf-8')),
+                    {'releases': ['0.3', '0.2']})
+        self.assertEquals(set(self.server.encodings), set(['gzip, deflate']))
+        self.assertEquals(self.transport.connections, 1)
+
+    def test_unread_response(self):
+        response = self.transport.urlopen('%s/egg/json' % self.service_url)
+        response.close()
+        self.transport.urlopen('%s/egg/json' % self.service_url).read()
+        self.assertEquals(self.transport.requests, 2)
+        self.assertEquals(self.transport.connections, 2)
+
+    def test_streamed_response(self):
+        response = self.transport.urlopen(
+            self.service_url.replace('/pypi', '/chunked/pypi') +
+            '/egg/json')
+        response.chunk_size = 4
+        chunks = list(response.iter_chunks())
+        self.assertEquals(len(chunks), 7)
+        self.assertEquals(json.loads(b''.join(chunks).decode('utf-8')),
+                          {'releases': ['0.3', '0.2']})
+        self.transport.urlopen('%s/egg/json' % self.service_url).read()
+        self.assertEquals(self.transport.connections, 1)
+
+    def test_read_timeout(self):
+        transport = HTTPTransport(5, read_timeout=0.01)
+        response = transport.urlopen(
+            self.service_url.replace('/pypi', '/slow/pypi') + '/egg/json')
+        with self.assertRaises(URLError) as context:
+            response.read()
+        self.assertEquals(str(context.exception.reason), 'timed out')
+        self.assertNotIsInstance(context.exception, ConnectError)
+        self.assertEquals(transport.idle, {})
+        transport.close()
+
+    def test_connect_error(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            url = 'http://127.0.0.1:%s/pypi' % sock.getsockname()[1]
+        with self.assertRaises(ConnectError):
+            self.transport.urlopen(url)
+        self.assertEquals(self.transport.idle, {})
+
+    def test_deadline(self):
+        url = self.service_url.replace('/pypi', '/slow/pypi') + '/egg/json'
+        start = time.monotonic()
+        with self.assertRaises(URLError) as context:
+            self.transport.urlopen(url, deadline=Deadline(0.12)).read()
+        self.assertEquals(str(context.exception.reason), 'timed out')
+        self.assertTrue(time.monotonic() - start < 0.3)
+        self.assertEquals(
+            json.loads(self.transport.urlopen(
+                url, deadline=Deadline(2)).read().decode('utf-8')),
+            {'releases': ['0.3', '0.2']})
+
+    def test_expired_deadline(self):
+        with self.assertRaises(URLError) as context:
+            self.transport.urlopen('%s/egg/json' % self.service_url,
+                                   deadline=Deadline(0))
+        self.assertEquals(context.exception.reason, 'timed out')
+        self.assertEquals(self.transport.idle, {})
+        self.assertEquals(self.server.statuses, [])
+
+    def test_reconnect_closed_connection(self):
+        self.transport.urlopen('%s/egg/json' % self.service_url).read()
+        for connection in self.transport.idle[('http', '127.0.0.1:%s' % (
+                self.server.server_port))]:
+            connection.sock.close()
+        self.transport.urlopen('%s/egg/json' % self.service_url).read()
+        self.assertEquals(self.transport.requests, 3)
+        self.assertEquals(self.transport.connections, 2)
+
+    def test_unknown_not_updated(self):
+        config_file = NamedTemporaryFile()
+        config_file.write('[versions]\nUnknowEgg = 1.2.3\n'.encode('utf-8'))
+        config_file.seek(0)
+        checker = VersionsChecker(
+            config_file.name, service_url=self.service_url, threads=1)
+        self.assertEquals(checker.last_versions, {'UnknowEgg': None})
+        self.assertEquals(checker.updates, {})
+        config_file.close()
+
+
+class AsyncHTTPTransportTestCase(LocalIndexTestCase):
+
+    def urlopen(self, *urls):
+        async def run():
+            transport = AsyncHTTPTransport(timeout=5)
+            try:
+                return transport, [
+                    json.loads((await (await transport.urlopen(url))
+                                .read()).decode('utf-8'))
+                    for url in urls]
+            finally:
+                await transport.close()
+
+        return asyncio.run(run())
+
+    def test_urlopen(self):
+        transport, results = self.urlopen(
+            '%s/egg/json' % self.service_url)
+        self.assertEquals(results, [{'releases': ['0.3', '0.2']}])
+
+    def test_deadline(self):
+        async def run(timeout, read_timeout=None):
+            transport = AsyncHTTPTransport(5, read_timeout=read_timeout)
+            try:
+                response = await transport.urlopen(
+                    self.service_url.replace('/pypi', '/slow/pypi') +
+                    '/egg/json', deadline=Deadline(timeout))
+                return json.loads((await response.read()).decode('utf-8'))
+            finally:
+                await transport.close()
+
+        start = time.monotonic()
+        for timeout, read_timeout in ((0.12, None), (5, 0.01)):
+            with self.assertRaises(URLError) as context:
+                asyncio.run(run(timeout, read_timeout))
+            self.assertEquals(context.exception.reason, 'timed out')
+            self.assertNotIsInstance(context.exception, ConnectError)
+        self.assertTrue(time.monotonic() - start < 0.5)
+        self.assertEquals(asyncio.run(run(2)), {'releases': ['0.3', '0.2']})
+
+    def test_connect_error(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            url = 'http://127.0.0.1:%s/pypi' % sock.getsockname()[1]
+        with self.assertRaises(ConnectError):
+            self.urlopen(url)
+
+    def test_urlopen_compressed(self):
+        self.server.encoding = 'gzip'
+        self.server.wbits = 16 + zlib.MAX_WBITS
+        transport, results = self.urlopen(
+            self.service_url.replace('/pypi', '/chunked/pypi') +
+            '/egg-dev/json', '%s/egg/json' % self.service_url)
+        self.assertEquals(results, [{'releases': ['1.0', '1.1b1']},
+                                    {'releases': ['0.3', '0.2']}])
+        self.assertEquals(self.server.encodings, ['gzip, deflate'] * 2)
+        self.assertEquals(transport.connections, 1)
+
+    def test_urlopen_chunked(self):
+        transport, results = self.urlopen(
+            self.service_url.replace('/pypi', '/chunked/pypi') +
+            '/egg-dev/json')
+        self.assertEquals(results, [{'releases': ['1.0', '1.1b1']}])
+
+    def test_urlopen_not_found(self):
+        with self.assertRaises(HTTPError) as context:
+            self.urlopen('%s/unknow/json' % self.service_url)
+        self.assertEquals(context.exception.code, 404)
+
+    def test_urlopen_redirection(self):
+        transport, results = self.urlopen(
+            self.service_url.replace('/pypi', '/moved/pypi') + '/egg/json')
+        self.assertEquals(results, [{'releases': ['0.3', '0.2']}])
+        self.assertEquals(transport.requests, 2)
+        self.assertEquals(transport.connections, 1)
+
+    def test_urlopen_connection_error(self):
+        with self.assertRaises(URLError):
+            self.urlopen('http://127.0.0.1:1/pypi/egg/json')
+
+    def test_persistent_connections(self):
+        transport, results = self.urlopen(
+            *['%s/egg/json' % self.service_url] * 5)
+        self.assertEquals(transport.requests, 5)
+        self.assertEquals(transport.connections, 1)
+
+    def test_fetch_last_versions(self):
+        checker = LazyVersionsChecker()
+        packages = [('egg', ''), ('egg-dev', '<1.1'),
+                    ('UnknowEgg', ''), ('egg', '<0.3')] * 10
+        self.assertEquals(
+            sorted(checker.fetch_last_versions(
+                packages, True, self.service_url, 5, 100, 'asyncio')),
+            sorted(checker.fetch_last_versions(
+                packages, True, self.service_url, 5, 4, 'threads')))
+        self.assertEquals(
+            dict(checker.fetch_last_versions(
+                packages[:3], False, self.service_url, 5, 100, 'asyncio')),
+            {'egg': '0.3', 'egg-dev': '1.0', 'UnknowEgg': None})
+
+
+class ReleasesCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.cache = ReleasesCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_path(self):
+        self.assertEquals(
+            self.cache.path('http://pypi/', 'Egg'),
+            self.cache.path('http://pypi', 'egg'))
+        self.assertNotEquals(
+            self.cache.path('http://pypi', 'egg'),
+            self.cache.path('http://mirror', 'egg'))
+
+    def test_get_set(self):
+        self.assertEquals(self.cache.get('http://pypi', 'egg'), None)
+        self.cache.set('http://pypi', 'egg', ['0.1'],
+                       {'ETag': '"abc"'})
+        entry = self.cache.get('http://pypi', 'egg')
+        self.assertEquals(entry['releases'], ['0.1'])
+        self.assertEquals(entry['etag'], '"abc"')
+        self.assertEquals(entry['last_modified'], None)
+        self.assertEquals(os.listdir(self.directory.name),
+                          [os.path.basename(
+                              self.cache.path('http://pypi', 'egg'))])
+
+    def test_get_read_only(self):
+        self.cache.set('http://pypi', 'egg', ['0.1'], {})
+
+        def utime(path):
+            raise PermissionError(path)
+
+        original_utime = os.utime
+        os.utime = utime
+        try:
+            entry = self.cache.get('http://pypi', 'egg')
+        finally:
+            os.utime = original_utime
+        self.assertEquals(entry['releases'], ['0.1'])
+
+    def test_set_without_validators(self):
+        self.cache.set('http://pypi', 'egg', ['0.1'], {})
+        entry = self.cache.get('http://pypi', 'egg')
+        self.assertEquals(entry['releases'], ['0.1'])
+        self.assertEquals(self.cache.validators(entry), {})
+
+    def test_fresh(self):
+        self.cache.set('http://pypi', 'egg', ['0.1'], {})
+        entry = self.cache.get('http://pypi', 'egg')
+        self.assertFalse(self.cache.fresh(None))
+        self.assertFalse(self.cache.fresh(entry))
+        self.cache.max_age = 60
+        self.assertTrue(self.cache.fresh(entry))
+        entry['fetched'] -= 61
+        self.assertFalse(self.cache.fresh(entry))
+
+    def test_set_unknown(self):
+        self.cache.set_unknown('http://pypi', 'egg', 410)
+        entry = self.cache.get('http://pypi', 'egg')
+        self.assertEquals(entry['releases'], [])
+        self.assertEquals(entry['unknown'], 410)
+        self.assertEquals(self.cache.validators(entry), {})
+        self.assertTrue(self.cache.fresh(entry))
+        entry['fetched'] -= 86401
+        self.assertFalse(self.cache.fresh(entry))
+        self.cache.unknown_max_age = 0
+        self.assertFalse(self.cache.fresh(
+            self.cache.get('http://pypi', 'egg')))
+
+    def test_refresh(self):
+        self.cache.set('http://pypi', 'egg', ['0.1'], {'ETag': '"abc"'})
+        entry = self.cache.get('http://pypi', 'egg')
+        entry['fetched'] = 0
+        self.cache.refresh(entry, {'Last-Modified': 'Tue, 15 Nov 1994'})
+        entry = self.cache.get('http://pypi', 'egg')
+        self.assertTrue(entry['fetched'] > 0)
+        self.assertEquals(entry['etag'], '"abc"')
+        self.assertEquals(entry['last_modified'], 'Tue, 15 Nov 1994')
+
+    def test_prune(self):
+        self.cache.max_entries = 2
+        for i, package in enumerate(['egg', 'spam', 'ham']):
+            self.cache.set('http://pypi', package, ['0.1'], {})
+            os.utime(self.cache.path('http://pypi', package), (i, i))
+        self.cache.get('http://pypi', 'egg')
+        self.cache.prune()
+        self.assertEquals(
+            sorted(os.listdir(self.directory.name)),
+            sorted(os.path.basename(self.cache.path('http://pypi', package))
+                   for package in ['egg', 'ham']))
+        self.cache.max_entries = 0
+        self.cache.prune()
+        self.assertEquals(os.listdir(self.directory.name), [])
+
+    def test_get_corrupted(self):
+        with open(self.cache.path('http://pypi', 'egg'), 'w') as fd:
+            fd.write('{"releases": ')
+        self.assertEquals(self.cache.get('http://pypi', 'egg'), None)
+
+    def test_validators(self):
+        self.assertEquals(self.cache.validators(None), {})
+        self.assertEquals(
+            self.cache.validators({'etag': '"abc"',
+                                   'last_modified': 'Tue, 15 Nov 1994'}),
+            {'If-None-Match': '"abc"',
+             'If-Modified-Since': 'Tue, 15 Nov 1994'})
+
+
+class CachedVersionsCheckerTestCase(LocalIndexTestCase):
+
+    def setUp(self):
+        super(CachedVersionsCheckerTestCase, self).setUp()
+        self.directory = TemporaryDirectory()
+        self.checker = LazyVersionsChecker(
+            cache=ReleasesCache(self.directory.name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super(CachedVersionsCheckerTestCase, self).tearDown()
+
+    def fetch(self, engine):
+        return sorted(self.checker.fetch_last_versions(
+            [('egg', ''), ('egg-dev', ''), ('UnknowEgg', '')], False,
+            self.service_url, 5, 2, engine))
+
+    def test_revalidation(self):
+        for engine in ('threads', 'threads', 'asyncio'):
+            self.assertEquals(
+                self.fetch(engine),
+                [('UnknowEgg', None), ('egg', '0.3'),
+                 ('egg-dev', '1.0')])
+        self.assertEquals(sorted(self.server.statuses),
+                          [200, 200] + [304] * 4 + [404])
+
+    def test_modified(self):
+        self.fetch('threads')
+        URLOpener.results['egg'] = {'releases': ['0.4', '0.3', '0.2']}
+        try:
+            self.assertEquals(
+                self.fetch('threads'),
+                [('UnknowEgg', None), ('egg', '0.4'),
+                 ('egg-dev', '1.0')])
+        finally:
+            URLOpener.results['egg'] = {'releases': ['0.3', '0.2']}
+        self.assertEquals(sorted(self.server.statuses),
+                          [200, 200, 200, 304, 404])
+
+    def test_max_age(self):
+        self.checker.cache.max_age = 60
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                self.fetch(engine),
+                [('UnknowEgg', None), ('egg', '0.3'),
+                 ('egg-dev', '1.0')])
+        self.assertEquals(sorted(self.server.statuses),
+                          [200, 200, 404])
+
+    def test_unknown(self):
+        self.checker.cache.unknown_max_age = 60
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                self.fetch(engine),
+                [('UnknowEgg', None), ('egg', '0.3'),
+                 ('egg-dev', '1.0')])
+        self.assertEquals(sorted(self.server.statuses),
+                          [200, 200, 304, 304, 404])
+        entry = self.checker.cache.get(self.service_url, 'UnknowEgg')
+        self.assertEquals(entry['unknown'], 404)
+        self.assertEquals(entry['releases'], [])
+
+        self.checker.cache.unknown_max_age = 0
+        self.fetch('threads')
+        self.assertEquals(self.server.statuses.count(404), 2)
+
+    def test_unknown_cached(self):
+        self.checker.cache.unknown_max_age = 60
+        self.checker.versions = OrderedDict([('UnknowEgg', '1.2.3')])
+        for i in range(2):
+            self.assertEquals(self.fetch('threads')[0], ('UnknowEgg', None))
+            self.assertEquals(
+                self.checker.find_updates(
+                    self.checker.versions, dict(self.fetch('threads'))),
+                [])
+        self.assertEquals(self.server.statuses.count(404), 1)
+
+    def test_include_unknown(self):
+        self.checker.include_unknown = True
+        for engine in ('threads', 'asyncio'):
+            self.fetch(engine)
+        self.assertEquals(self.server.statuses.count(404), 2)
+
+    def test_unknown_become_known(self):
+        self.fetch('threads')
+        URLOpener.results['UnknowEgg'] = {'releases': ['1.0']}
+        try:
+            self.checker.include_unknown = True
+            self.assertEquals(
+                self.fetch('threads'),
+                [('UnknowEgg', '1.0'), ('egg', '0.3'),
+                 ('egg-dev', '1.0')])
+            self.checker.include_unknown = False
+            self.checker.cache.max_age = 60
+            self.assertEquals(self.fetch('threads')[0], ('UnknowEgg', '1.0'))
+        finally:
+            del URLOpener.results['UnknowEgg']
+        self.assertEquals(sorted(self.server.statuses),
+                          [200] * 3 + [304] * 2 + [404])
+
+    def test_unsorted_entry(self):
+        self.checker.cache.max_age = 60
+        self.checker.cache.write({
+            'service_url': self.service_url, 'package': 'egg',
+            'releases': ['0.3', '0.10', 'invalid', '0.9'],
+            'fetched': time.time()})
+        self.assertEquals(self.fetch('threads')[1], ('egg', '0.10'))
+        self.fetch('threads')
+        entry = self.checker.cache.get(self.service_url, 'egg-dev')
+        self.assertEquals(entry['releases'], ['1.0', '1.1b1'])
+        self.assertTrue(entry['sorted'])
+
+
+class VersionsTestCase(TestCase):
+
+    def setUp(self):
+        clear()
+
+    def test_memo(self):
+        self.assertEquals(hit_rates(), {'versions': (0, 0, 0),
+                                        'specifiers': (0, 0, 0)})
+        version = parse_version('1.0')
+        self.assertTrue(parse_version('1.0') is version)
+        self.assertEquals(parse_version('1.0.0'), version)
+        specifier = specifier_set('<2.0', False)
+        self.assertTrue(specifier_set('<2.0', False) is specifier)
+        self.assertFalse(specifier_set('<2.0', True) is specifier)
+        self.assertEquals(hit_rates(), {'versions': (1, 2, 1.0 / 3),
+                                        'specifiers': (1, 2, 1.0 / 3)})
+
+
+class ReleasesTestCase(TestCase):
+
+    def test_sort_releases(self):
+        self.assertEquals(
+            sort_releases(['1.0', '0.10', 'invalid', '1.0b1',
+                           '0.9', '1.0.post1', '0.10.0']),
+            ['0.9', '0.10', '0.10.0', '1.0b1', '1.0', '1.0.post1'])
+
+    def test_filename_version(self):
+        for filename, package, version in [
+                ('egg-1.0.tar.gz', 'egg', '1.0'),
+                ('Egg-1.0.zip', 'egg', '1.0'),
+                ('django-tagging-0.3.1.tar.gz', 'django-tagging', '0.3.1'),
+                ('django_tagging-0.3.1.tar.bz2', 'django-tagging', '0.3.1'),
+                ('zope.interface-5.0.0.tgz', 'zope.interface', '5.0.0'),
+                ('egg-1.0-py3-none-any.whl', 'egg', '1.0'),
+                ('zope.interface-5.0.0-cp38-cp38-manylinux1_x86_64.whl',
+                 'zope.interface', '5.0.0'),
+                ('egg-1.0-py2.7.egg', 'egg', '1.0'),
+                ('egg-1.0.exe', 'egg', None),
+                ('spam-1.0.tar.gz', 'egg', None),
+                ('egg.tar.gz', 'egg', None)]:
+            self.assertEquals(filename_version(filename, package), version)
+
+    def test_json_releases_parser(self):
+        document = json.dumps(OrderedDict([
+            ('info', {'name': 'egg', 'releases': {'9.9': []},
+                      'description': 'Quoted "{releases}" \\ [\u00e9]'}),
+            ('last_serial', 42),
+            ('releases', OrderedDict([
+                ('0.1', []),
+                ('1.0', [{'filename': 'egg-1.0.tar.gz', 'size': 12,
+                          'digests': {'md5': 'abc'}, 'yanked': False}]),
+                ('2.0\u00e9"', [{'comment_text': None}])])),
+            ('urls', [{'filename': 'egg-2.0.tar.gz', 'releases': {}}]),
+        ])).encode('utf-8')
+        for size in range(1, len(document) + 1):
+            parser = JSONReleasesParser('egg')
+            for i in range(0, len(document), size):
+                parser.feed(document[i:i + size])
+            self.assertEquals(parser.close(), ['0.1', '1.0', '2.0\u00e9"'])
+
+    def test_json_releases_parser_large_document(self):
+        release = [{'filename': 'egg.tar.gz', 'size': 1024,
+                    'digests': {'sha256': 'a' * 64}, 'url': 'x' * 100}]
+        document = json.dumps({
+            'info': {'description': 'x' * 1000000},
+            'releases': dict(('%d.0' % i, release * 10)
+                             for i in range(1000))}).encode('utf-8')
+        parser = JSONReleasesParser('egg')
+        for i in range(0, len(document), 16384):
+            parser.feed(document[i:i + 16384])
+            self.assertTrue(len(parser.pending) < 2)
+        self.assertEquals(len(parser.close()), 1000)
+
+    def test_json_releases_parser_errors(self):
+        for document, error in [
+                (b'[]', 'No releases found for egg'),
+                (b'{"info": {}}', 'No releases found for egg'),
+                (b'{"releases": {"1.0": [', 'Truncated JSON document'),
+                (b'{"releases": {"1.0', 'Truncated JSON document'),
+                (b'{}]', 'Invalid JSON document')]:
+            parser = JSONReleasesParser('egg')
+            with self.assertRaises(ValueError) as context:
+                parser.feed(document)
+                parser.close()
+            self.assertEquals(str(context.exception), error)
+
+    def test_simple_html_releases_parser(self):
+        page = '<!DOCTYPE html>\n<html><body><h1>Links for egg</h1>\n%s' \
+            '</body></html>' % ''.join(
+                '<a href="https://files/%s/egg-%s.tar.gz#sha256=%s" '
+                'data-requires-python="&gt;=3.7">egg-%s.tar.gz</a><br/>\n'
+                '<a href="/egg-%s-py3-none-any.whl">'
+                'egg-%s-py3-none-any.whl</a><br/>\n' % (
+                    i, i, 'a' * 64, i, i, i)
+                for i in range(5000))
+        page = page.encode('utf-8')
+        parser = SimpleHTMLReleasesParser('egg')
+        for i in range(0, len(page), 1000):
+            parser.feed(page[i:i + 1000])
+            self.assertTrue(len(parser.parser.rawdata) < 1000)
+        releases = parser.close()
+        self.assertEquals(sorted(releases, key=int),
+                          [str(i) for i in range(5000)])
+
+    def test_simple_html_releases_parser_split_characters(self):
+        page = '<a href="egg-1.0.tar.gz">\u00e9gg</a>' \
+            '<a href="egg%2D2.0.zip">egg</a><a name="top">' \
+            '<a href="spam-3.0.zip">spam</a>'.encode('utf-8')
+        parser = SimpleHTMLReleasesParser('egg')
+        for i in range(len(page)):
+            parser.feed(page[i:i + 1])
+        self.assertEquals(sorted(parser.close()), ['1.0', '2.0'])
+
+    def test_parse_releases(self):
+        self.assertEquals(
+            parse_releases(JSONReleasesParser, 'egg', json.dumps(
+                {'releases': {'1.0': [], '0.10': [], '0.9': []}}
+            ).encode('utf-8')),
+            ['0.9', '0.10', '1.0'])
+
+    def test_parsing_pool(self):
+        pool = ParsingPool(1)
+        try:
+            self.assertEquals(
+                pool.parse(SimpleHTMLReleasesParser, 'egg',
+                           b'<a href="egg-1.0.zip"><a href="egg-0.9.zip">'),
+                ['0.9', '1.0'])
+            self.assertRaises(
+                ValueError, pool.parse, JSONReleasesParser, 'egg', b'{}')
+        finally:
+            pool.close()
+
+    def test_parsing_pool_close(self):
+        pool = ParsingPool(1)
+        tasks = [pool.submit(JSONReleasesParser, 'egg', b'{}')
+                 for i in range(10)]
+        pool.close()
+        self.assertTrue(any(task.cancelled() for task in tasks))
+        self.assertEquals(pool.pending, set())
+
+    def test_parse_simple_json_releases(self):
+        self.assertEquals(
+            parse_simple_json_releases(json.dumps({
+                'files': [], 'versions': ['1.0', '1.1']}), 'egg'),
+            ['1.0', '1.1'])
+        self.assertEquals(
+            sorted(parse_simple_json_releases(json.dumps({
+                'files': [{'filename': 'egg-1.0.tar.gz'},
+                          {'filename': 'egg-1.0-py3-none-any.whl'},
+                          {'filename': 'egg-1.1.zip'},
+                          {'filename': 'egg-1.2.exe'}]}), 'egg')),
+            ['1.0', '1.1'])
+
+
+class SimpleAPIVersionsCheckerTestCase(LocalIndexTestCase):
+
+    def test_fetch_last_versions(self):
+        checker = LazyVersionsChecker(api='simple')
+        packages = [('egg', ''), ('egg-dev', ''),
+                    ('Egg_Dev', '<1.0'), ('UnknowEgg', '')]
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    packages, True, self.service_url.replace(
+                        '/pypi', '/simple'), 5, 2, engine)),
+                [('Egg_Dev', '0.0.0'), ('UnknowEgg', None),
+                 ('egg', '0.3'), ('egg-dev', '1.1b1')])
+
+    def test_fetch_last_versions_compressed(self):
+        self.server.encoding = 'gzip'
+        self.server.wbits = 16 + zlib.MAX_WBITS
+        checker = LazyVersionsChecker(api='simple')
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', '')], True,
+                    self.service_url.replace('/pypi', '/simple'),
+                    5, 2, engine)),
+                [('egg', '0.3'), ('egg-dev', '1.1b1')])
+        self.assertEquals(self.server.encodings, ['gzip, deflate'] * 4)
+
+    def test_fetch_last_versions_html(self):
+        checker = LazyVersionsChecker(api='simple')
+        packages = [('egg', ''), ('egg-dev', ''),
+                    ('Egg_Dev', '<1.0'), ('UnknowEgg', '')]
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    packages, True, self.service_url.replace(
+                        '/pypi', '/html/simple'), 5, 2, engine)),
+                [('Egg_Dev', '0.0.0'), ('UnknowEgg', None),
+                 ('egg', '0.3'), ('egg-dev', '1.1b1')])
+
+    def test_package_url(self):
+        checker = LazyVersionsChecker(api='simple')
+        self.assertEquals(
+            checker.package_url('http://pypi/simple/', 'Zope.Interface'),
+            'http://pypi/simple/zope-interface/')
+        self.assertEquals(checker.request_headers(None),
+                          {'Accept': SIMPLE_ACCEPT})
+
+
+class ThrottleTestCase(TestCase):
+
+    def assertDelays(self, delays, expected):  # noqa
+        self.assertEquals(len(delays), len(expected))
+        for delay, value in zip(delays, expected):
+            self.assertAlmostEqual(delay, value, places=6)
+
+    def clock(self):
+        return self.now
+
+    def test_token_bucket(self):
+        self.now = 1000.0
+        bucket = TokenBucket(10, clock=self.clock)
+        self.assertDelays([bucket.reserve() for i in range(4)],
+                          [0, 0.1, 0.2, 0.3])
+        self.now += 0.25
+        self.assertDelays([bucket.reserve()], [0.15])
+        self.now += 1
+        self.assertDelays([bucket.reserve()], [0])
+        bucket = TokenBucket(10, capacity=3, clock=self.clock)
+        self.assertDelays([bucket.reserve() for i in range(4)],
+                          [0, 0, 0, 0.1])
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertTrue(time.monotonic() - start > 0.15)
+
+    def test_token_bucket_shared(self):
+        self.now = 1000.0
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rate')
+            first = TokenBucket(10, path=path, clock=self.clock)
+            second = TokenBucket(10, path=path, clock=self.clock)
+            self.assertDelays([first.reserve(), second.reserve(),
+                               first.reserve()], [0, 0.1, 0.2])
+            with open(path, 'w') as rate_file:
+                rate_file.write('garbage')
+            self.assertDelays([first.reserve()], [0])
+
+    def test_limit(self):
+        limit = Limit(3)
+        limit.record(0, True)
+        self.assertEquals(limit.concurrency, 3)
+
+    def test_adaptive_limit_slow_start(self):
+        limit = AdaptiveLimit(initial=2, maximum=6)
+        for i in range(3):
+            limit.record(time.monotonic())
+        self.assertEquals(limit.concurrency, 5)
+        for i in range(3):
+            limit.record(time.monotonic())
+        self.assertEquals(limit.concurrency, 6)
+
+    def test_adaptive_limit_overload(self):
+        limit = AdaptiveLimit(initial=10, minimum=2)
+        started = time.monotonic()
+        limit.record(started, True)
+        self.assertEquals(limit.concurrency, 5)
+        limit.record(started, True)
+        self.assertEquals(limit.concurrency, 5)
+        for i in range(3):
+            limit.record(time.monotonic(), True)
+        self.assertEquals(limit.concurrency, 2)
+        limit.record(time.monotonic())
+        limit.record(time.monotonic())
+        self.assertAlmostEqual(limit.window, 2.9)
+
+    def test_adaptive_limit_latency(self):
+        limit = AdaptiveLimit(initial=10)
+        now = time.monotonic()
+        limit.record(now - 0.01)
+        limit.record(now - 0.01)
+        self.assertEquals(limit.concurrency, 12)
+        limit.record(now - 1)
+        self.assertEquals(limit.concurrency, 6)
+
+    def test_throttle(self):
+        throttle = Throttle(Limit(2))
+        started = [throttle.acquire(), throttle.acquire()]
+        thread = Thread(target=throttle.acquire)
+        thread.start()
+        thread.join(0.05)
+        self.assertTrue(thread.is_alive())
+        throttle.release(started[0])
+        thread.join()
+        self.assertEquals(throttle.in_flight, 2)
+
+    def test_async_throttle(self):
+        async def run():
+            throttle = AsyncThrottle(Limit(2))
+            order = []
+
+            async def request(i):
+                started = await throttle.acquire()
+                order.append(('start', i, throttle.in_flight))
+                await asyncio.sleep(0.01)
+                order.append(('end', i))
+                await throttle.release(started)
+
+            await asyncio.gather(*[request(i) for i in range(3)])
+            return order
+
+        order = asyncio.run(run())
+        self.assertEquals(order[:2], [('start', 0, 1), ('start', 1, 2)])
+        self.assertEquals(order[2], ('end', 0))
+        self.assertEquals(max(entry[-1] for entry in order
+                              if entry[0] == 'start'), 2)
+
+
+class AdaptiveConcurrencyTestCase(LogsTestCase,
+                                  LocalIndexTestCase):
+
+    def setUp(self):
+        super(AdaptiveConcurrencyTestCase, self).setUp()
+        self.server.delay = 0.01
+
+    def test_fetch_last_versions(self):
+        checker = LazyVersionsChecker()
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                dict(checker.fetch_last_versions(
+                    [('egg', '')] * 20, False,
+                    self.service_url, 5, 'auto', engine)),
+                {'egg': '0.3'})
+            self.assertEquals(
+                self.logs.messages['info'][-2],
+                '- 20 requests sent over %s connections.' % (
+                    self.logs.messages['info'][-2].split()[-2]))
+            self.assertTrue(self.logs.messages['info'][-1].startswith(
+                '- Concurrency adapted to '))
+
+    def test_overloaded_service(self):
+        checker = LazyVersionsChecker(retry_backoff=0.01)
+        service_url = self.service_url.replace('/pypi', '/busy/pypi')
+        for engine in ('threads', 'asyncio'):
+            self.server.statuses = []
+            checker.fetch_last_versions(
+                [('egg', '')] * 60, False, service_url, 5, 'auto', engine)
+            self.assertTrue(self.server.statuses.count(503) < 30)
+            self.assertTrue(int(self.logs.messages['info'][-1].split()[4])
+                            <= 8)
+
+        self.server.statuses = []
+        checker.fetch_last_versions(
+            [('egg', '')] * 60, False, service_url, 5, 30)
+        self.assertTrue(self.server.statuses.count(503) > 30)
+
+
+class RoutedVersionsCheckerTestCase(LogsTestCase,
+                                    LocalIndexTestCase):
+
+    def setUp(self):
+        super(RoutedVersionsCheckerTestCase, self).setUp()
+        self.server.capacity = 1
+        self.host = 'localhost:%s' % self.server.server_port
+        self.checker = LazyVersionsChecker(
+            retries=0, routes={'egg*': 'http://%s/busy/pypi' % self.host})
+
+    def fetch(self, engine):
+        self.server.statuses = []
+        return self.checker.fetch_last_versions(
+            [('egg', ''), ('egg-dev', '')] * 5 + [('UnknowEgg', '')],
+            False, self.service_url, 5, 10, engine)
+
+    def test_host_limits(self):
+        self.checker.host_limits = {self.host: 1}
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                sorted(self.fetch(engine)),
+                [('UnknowEgg', None)] + [('egg', '0.3')] * 5 +
+                [('egg-dev', '1.0')] * 5)
+            self.assertEquals(sorted(set(self.server.statuses)),
+                              [200, 404])
+
+    def test_no_host_limits(self):
+        for engine in ('threads', 'asyncio'):
+            self.assertTrue(('egg', None) in self.fetch(engine))
+            self.assertTrue(503 in self.server.statuses)
+
+
+class RetryTestCase(TestCase):
+
+    def test_retryable(self):
+        self.assertTrue(retryable(URLError('timed out')))
+        self.assertTrue(retryable(HTTPError('url', 503, '', {}, None)))
+        self.assertTrue(retryable(HTTPError('url', 429, '', {}, None)))
+        self.assertFalse(retryable(HTTPError('url', 404, '', {}, None)))
+        self.assertFalse(retryable(ValueError()))
+
+    def test_retry_after(self):
+        for headers, delay in [({}, None),
+                               ({'Retry-After': '2'}, 2.0),
+                               ({'Retry-After': '-1'}, 0.0),
+                               ({'Retry-After': 'Wed, 21 Oct 2015'}, None)]:
+            self.assertEquals(
+                retry_after(HTTPError('url', 503, '', headers, None)),
+                delay)
+        self.assertEquals(retry_after(URLError('timed out')), None)
+
+    def test_backoff(self):
+        for attempt, bound in ((0, 0.5), (1, 1.0), (2, 2.0), (10, 10.0)):
+            delays = [backoff(attempt) for i in range(100)]
+            self.assertTrue(0 <= min(delays) <= max(delays) <= bound)
+            self.assertTrue(max(delays) > bound / 2)
+
+    def test_hedging(self):
+        hedging = Hedging(window=10, minimum=5)
+        for i in range(4):
+            hedging.record(i)
+        self.assertEquals(hedging.delay(), None)
+        for i in range(4, 20):
+            hedging.record(i / 10.0)
+        self.assertEquals(hedging.delay(), 1.8)
+        self.assertTrue(hedging.spend())
+        self.assertTrue(hedging.spend())
+        self.assertFalse(hedging.spend())
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker('url', 2)
+        breaker.check()
+        breaker.record(ConnectError('refused'), 'egg')
+        breaker.record(HTTPError('url', 503, '', {}, None), 'egg')
+        breaker.record(ConnectError('refused'), 'egg')
+        breaker.record(URLError('timed out'), 'egg-dev')
+        breaker.record(ConnectError('refused'), 'egg')
+        breaker.record(ConnectError('refused'), 'egg')
+        breaker.check()
+        breaker.record(ConnectError('timed out'), 'egg-dev')
+        with self.assertRaises(CircuitOpen) as context:
+            breaker.check()
+        self.assertEquals(
+            str(context.exception),
+            'url is unavailable, 2 packages failed in a row: timed out')
+
+        breaker = CircuitBreaker('url', 0)
+        for i in range(10):
+            breaker.record(ConnectError('refused'), i)
+        breaker.check()
+
+    def test_ranking(self):
+        ranking = Ranking(['a', 'b', 'c'])
+        self.assertEquals(ranking.ranked(), ['a', 'b', 'c'])
+        self.assertEquals(ranking.stagger('a'), 1.0)
+        ranking.record('c', 0.1)
+        ranking.record('b', 0.2)
+        self.assertEquals(ranking.ranked(), ['c', 'b', 'a'])
+        self.assertEquals(ranking.stagger('c'), 0.2)
+        ranking.failed('c', 0.01)
+        self.assertEquals(ranking.ranked(), ['b', 'c', 'a'])
+        self.assertEquals(ranking.stagger('c'), 1.0)
+        ranking.record('c', 0.0)
+        self.assertEquals(ranking.latencies['c'], 0.7)
+        ranking.record('a', 0.001)
+        self.assertEquals(ranking.stagger('a'), 0.1)
+
+    def test_ranking_budget(self):
+        ranking = Ranking(['a', 'b'], budget=0.5)
+        self.assertTrue(ranking.spend())
+        self.assertFalse(ranking.spend())
+        for i in range(4):
+            ranking.record('a', 0.1)
+        self.assertTrue(ranking.spend())
+        self.assertTrue(ranking.spend())
+        self.assertFalse(ranking.spend())
+
+
+class RetriedVersionsCheckerTestCase(LogsTestCase,
+                                     LocalIndexTestCase):
+
+    def setUp(self):
+        super(RetriedVersionsCheckerTestCase, self).setUp()
+        self.checker = LazyVersionsChecker(retry_backoff=0.01)
+        self.service_url = self.service_url.replace('/pypi', '/flaky/pypi')
+
+    def test_retries(self):
+        for engine in ('threads', 'asyncio'):
+            self.server.failures = {}
+            self.assertEquals(
+                sorted(self.checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', ''), ('UnknowEgg', '')],
+                    False, self.service_url, 5, 2, engine)),
+                [('UnknowEgg', None), ('egg', '0.3'),
+                 ('egg-dev', '1.0')])
+        self.assertEquals(self.server.statuses.count(503), 6)
+        self.assertEquals(self.server.statuses.count(404), 2)
+
+    def test_retries_exhausted(self):
+        self.server.max_failures = 3
+        self.checker.retries = 2
+        for engine in ('threads', 'asyncio'):
+            self.server.failures = {}
+            self.assertEquals(
+                self.checker.fetch_last_versions(
+                    [('egg', '')], False, self.service_url, 5, 2, engine),
+                [('egg', None)])
+        self.assertEquals(self.server.statuses, [503] * 6)
+        self.assertEquals(
+            self.logs.messages['debug'][-2],
+            '!> %s/egg/json Service Unavailable' % self.service_url)
+
+    def test_retries_deadline(self):
+        self.server.retry_after = '10'
+        self.assertEquals(
+            self.checker.fetch_last_versions(
+                [('egg', '')], False, self.service_url, 0.5, 2),
+            [('egg', None)])
+        self.assertEquals(self.server.statuses, [503])
+
+    def test_attempt_failed(self):
+        self.checker.retries = 1
+        self.checker.unchecked = set()
+        refused = URLError('refused')
+        unknown = HTTPError('url', 404, 'Not Found', {}, None)
+        self.assertTrue(0 <= self.checker.attempt_failed(
+            self.service_url, 'egg', refused, 0, Deadline(5)) <= 0.01)
+        self.assertEquals(self.checker.attempt_failed(
+            self.service_url, 'egg', refused, 1, Deadline(5)), None)
+        self.assertEquals(self.checker.attempt_failed(
+            self.service_url, 'egg', unknown, 0, Deadline(5)), None)
+        self.assertEquals(self.logs.messages['debug'],
+                          ['-> egg unknown by the service.'])
+        self.assertEquals(self.checker.unchecked, set())
+
+    def test_retries_slow(self):
+        self.server.delay = 0.15
+        service_url = self.service_url.replace('/flaky/pypi', '/slow/pypi')
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                self.checker.fetch_last_versions(
+                    [('egg', '')], False, service_url, 1.5, 1, engine),
+                [('egg', '0.3')])
+        self.assertEquals(self.server.statuses, [200] * 2)
+
+    def test_retries_read_timeout(self):
+        self.server.delay = 0.2
+        self.checker.read_timeout = 0.1
+        self.checker.retries = 1
+        service_url = self.service_url.replace('/flaky/pypi', '/slow/pypi')
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                self.checker.fetch_last_versions(
+                    [('egg', '')], False, service_url, 5, 1, engine),
+                [('egg', None)])
+        self.assertEquals(self.server.statuses, [200] * 4)
+        self.assertEquals(
+            [message for message in self.logs.messages['debug']
+             if message.startswith('!>')],
+            ['!> %s/egg/json timed out' % service_url] * 4)
+
+    def test_hedge(self):
+        self.checker.hedging = Hedging(minimum=1)
+        self.checker.hedging.record(0.01)
+        self.checker.hedger = futures.ThreadPoolExecutor(2)
+        calls = []
+
+        def request(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                time.sleep(0.5)
+                return ['slow']
+            return ['fast']
+
+        start = time.monotonic()
+        self.assertEquals(self.checker.hedge(
+            request, None, 'url', 'egg', None, None), ['fast'])
+        self.assertTrue(time.monotonic() - start < 0.4)
+        self.assertEquals(len(calls), 2)
+        self.assertEquals(self.logs.messages['debug'],
+                          ['-> Hedging the request of egg.'])
+        self.assertEquals(self.checker.hedge(
+            request, None, 'url', 'egg', None, None), ['fast'])
+        self.assertEquals(len(calls), 3)
+        self.checker.hedger.shutdown()
+
+    def test_hedge_failure(self):
+        self.checker.hedging = Hedging(minimum=1, budget=1)
+        self.checker.hedging.record(0.01)
+        self.checker.hedger = futures.ThreadPoolExecutor(2)
+        calls = []
+
+        def request(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise URLError('refused')
+            time.sleep(0.05)
+            return ['slow']
+
+        self.assertEquals(self.checker.hedge(
+            request, None, 'url', 'egg', None, None), ['slow'])
+        self.checker.hedger.shutdown()
+
+    def test_hedge_async(self):
+        self.checker.hedging = Hedging(minimum=1)
+        self.checker.hedging.record(0.01)
+        calls = []
+
+        async def request(*args):
+            calls.append(args)
+            try:
+                if len(calls) == 1:
+                    await asyncio.sleep(0.5)
+                    return ['slow']
+                return ['fast']
+            except asyncio.CancelledError:
+                calls.append('cancelled')
+                raise
+
+        start = time.monotonic()
+        self.assertEquals(asyncio.run(self.checker.hedge_async(
+            request, None, 'url', 'egg', None, None)), ['fast'])
+        self.assertTrue(time.monotonic() - start < 0.4)
+        self.assertEquals(calls[-1], 'cancelled')
+
+    def test_fetch_last_versions_hedged(self):
+        self.checker.hedging = Hedging(minimum=1)
+        self.checker.hedging.record(0.01)
+        for engine in ('threads', 'asyncio'):
+            self.server.failures = {}
+            self.assertEquals(
+                sorted(self.checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', '')], False,
+                    self.service_url.replace('/flaky/', '/'), 5, 2, engine)),
+                [('egg', '0.3'), ('egg-dev', '1.0')])
+
+
+class MirroredVersionsCheckerTestCase(LogsTestCase,
+                                      LocalIndexTestCase):
+
+    def setUp(self):
+        super(MirroredVersionsCheckerTestCase, self).setUp()
+        self.checker = LazyVersionsChecker(retries=0)
+        self.checker.ranking = Ranking(['first', 'second'])
+        self.checker.hedger = futures.ThreadPoolExecutor(2)
+        self.dead_url = 'http://127.0.0.1:%s/pypi' % self.unused_port()
+
+    def tearDown(self):
+        self.checker.hedger.shutdown()
+        super(MirroredVersionsCheckerTestCase, self).tearDown()
+
+    def unused_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def test_race(self):
+        self.checker.ranking.record('first', 0.01)
+        calls = []
+
+        def request(*args):
+            calls.append(args[-1])
+            if args[-1] == 'first':
+                time.sleep(0.5)
+                return ['slow']
+            return ['fast']
+
+        start = time.monotonic()
+        self.assertEquals(self.checker.race(request, [
+            (None, 'url', 'egg', None, None, 'first'),
+            (None, 'url', 'egg', None, None, 'second')]), ['fast'])
+        self.assertTrue(time.monotonic() - start < 0.4)
+        self.assertEquals(calls, ['first', 'second'])
+        self.assertEquals(self.logs.messages['debug'],
+                          ['-> Racing the request of egg on second.'])
+        self.assertEquals(self.checker.ranking.latencies, {'first': 1.0})
+
+    def test_race_budget(self):
+        self.checker.ranking.record('first', 0.01)
+        self.checker.ranking.races = 1
+        calls = []
+
+        def request(*args):
+            calls.append(args[-1])
+            time.sleep(0.2)
+            return [args[-1]]
+
+        calls_args = [(None, 'url', 'egg', None, None, 'first'),
+                      (None, 'url', 'egg', None, None, 'second')]
+        self.assertEquals(self.checker.race(request, calls_args), ['first'])
+        self.assertEquals(asyncio.run(self.checker.race_async(
+            self.async_request(request), calls_args)), ['first'])
+        self.assertEquals(calls, ['first', 'first'])
+        self.assertEquals(self.logs.messages['debug'], [])
+
+    def test_race_unknown(self):
+        def request(*args):
+            if args[-1] == 'first':
+                raise HTTPError('url', 404, 'Not Found', {}, None)
+            time.sleep(0.05)
+            return ['found']
+
+        calls = [(None, 'url', 'egg', None, None, 'first'),
+                 (None, 'url', 'egg', None, None, 'second')]
+        self.assertEquals(self.checker.race(request, calls), ['found'])
+        self.assertEquals(asyncio.run(self.checker.race_async(
+            self.async_request(request), calls)), ['found'])
+
+    def test_race_error(self):
+        unknown = HTTPError('url', 404, 'Not Found', {}, None)
+        unavailable = HTTPError('url', 503, 'Unavailable', {}, None)
+        self.assertEquals(self.checker.race_error([unknown, unavailable]),
+                          unknown)
+        self.assertEquals(self.checker.race_error([unavailable, unknown]),
+                          unknown)
+        self.assertEquals(self.checker.race_error([unavailable]),
+                          unavailable)
+
+    def test_race_async(self):
+        self.checker.ranking.record('first', 0.01)
+        calls = []
+
+        async def request(*args):
+            calls.append(args[-1])
+            try:
+                if args[-1] == 'first':
+                    await asyncio.sleep(0.5)
+                    return ['slow']
+                return ['fast']
+            except asyncio.CancelledError:
+                calls.append('cancelled')
+                raise
+
+        start = time.monotonic()
+        self.assertEquals(asyncio.run(self.checker.race_async(request, [
+            (None, 'url', 'egg', None, None, 'first'),
+            (None, 'url', 'egg', None, None, 'second')])), ['fast'])
+        self.assertTrue(time.monotonic() - start < 0.4)
+        self.assertEquals(calls, ['first', 'second', 'cancelled'])
+
+    def async_request(self, request):
+        async def async_request(*args):
+            return request(*args)
+        return async_request
+
+    def test_dead_mirror(self):
+        checker = LazyVersionsChecker(retries=0)
+        for engine in ('threads', 'asyncio'):
+            start = time.monotonic()
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', ''), ('UnknowEgg', '')],
+                    False, [self.dead_url, self.service_url], 5, 1,
+                    engine)),
+                [('UnknowEgg', None), ('egg', '0.3'),
+                 ('egg-dev', '1.0')])
+            self.assertTrue(time.monotonic() - start < 1)
+        self.assertTrue(
+            4 <= len([message for message in self.logs.messages['debug']
+                      if message.startswith('!> %s' % self.dead_url)]) <= 6)
+
+    def test_dead_index(self):
+        checker = LazyVersionsChecker(retries=0, max_failures=2)
+        for engine in ('threads', 'asyncio'):
+            with self.assertRaises(CircuitOpen):
+                checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', '')] * 5, False,
+                    self.dead_url, 5, 1, engine)
+        self.assertEquals(
+            len([message for message in self.logs.messages['debug']
+                 if message.startswith('!> %s' % self.dead_url)]), 4)
+
+    def test_slow_index(self):
+        checker = LazyVersionsChecker(read_timeout=0.01, max_failures=1,
+                                      retry_backoff=0.01)
+        slow_url = self.service_url.replace('/pypi', '/slow/pypi')
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', '')], False,
+                    slow_url, 5, 1, engine)),
+                [('egg', None), ('egg-dev', None)])
+        self.assertEquals(self.server.statuses, [200] * 12)
+
+    def test_dead_mirror_failover(self):
+        checker = LazyVersionsChecker(retries=0, max_failures=1)
+        for engine in ('threads', 'asyncio'):
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', '')] * 5, False,
+                    [self.dead_url, self.service_url], 5, 1, engine)),
+                [('egg', '0.3')] * 5 + [('egg-dev', '1.0')] * 5)
+        self.assertEquals(
+            len([message for message in self.logs.messages['debug']
+                 if message.startswith('!> %s' % self.dead_url)]), 2)
+
+    def test_slow_mirror(self):
+        checker = LazyVersionsChecker(retries=0)
+        self.server.delay = 1
+        slow_url = self.service_url.replace('/pypi', '/slow/pypi')
+        for engine in ('threads', 'asyncio'):
+            start = time.monotonic()
+            self.assertEquals(
+                sorted(checker.fetch_last_versions(
+                    [('egg', ''), ('egg-dev', '')], False,
+                    [slow_url, self.service_url], 3, 1, engine)),
+                [('egg', '0.3'), ('egg-dev', '1.0')])
+            self.assertTrue(time.monotonic() - start < 2)
+        self.assertEquals(
+            len([message for message in self.logs.messages['debug']
+                 if message.startswith('-> Racing the request of')]), 2)
+
 
 class UnusedVersionsCheckerTestCase(StubbedListDirTestCase):
 
@@ -343,6 +2076,76 @@ class UnusedVersionsCheckerTestCase(StubbedListDirTestCase):
             ['unused'])
 
 
+class ExtendsResolverTestCase(LogsTestCase):
+
+    def setUp(self):
+        super(ExtendsResolverTestCase, self).setUp()
+        self.directory = TemporaryDirectory()
+        self.resolver = ExtendsResolver()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super(ExtendsResolverTestCase, self).tearDown()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fd:
+            fd.write(content)
+        return path
+
+    def test_resolve(self):
+        self.write('bases/base.cfg', '[versions]\negg = 0.1\n'
+                   'spam = 1.0\nham = 2.0\nbacon = 3.0\n')
+        self.write('bases/other.cfg', '[buildout]\nextends = base.cfg\n'
+                   '[versions]\nspam = 1.1\n')
+        self.write('empty.cfg', '[buildout]\nparts =\n')
+        source = self.write(
+            'versions.cfg', '[buildout]\nextends =\n'
+            '    bases/base.cfg\n    bases/other.cfg empty.cfg\n'
+            '    http://example.com/versions.cfg\n'
+            '[versions]\negg = 0.2\nham -= 2.0\nbacon += 3.1\n'
+            'Egg += 0.3\n')
+        self.assertEquals(
+            list(self.resolver.resolve(source).items()),
+            [('egg', '0.2'), ('spam', '1.1'), ('bacon', '3.0\n3.1'),
+             ('Egg', '0.3')])
+        self.assertEquals(len(self.resolver.files), 4)
+        self.assertEquals(
+            self.logs.messages['warning'],
+            ["'http://example.com/versions.cfg' extended by "
+             "%s is not a local file." % source])
+
+    def test_resolve_cached(self):
+        base = self.write('base.cfg', '[versions]\negg = 0.1\n')
+        source = self.write('versions.cfg', '[buildout]\n'
+                            'extends = base.cfg\n')
+        self.assertEquals(self.resolver.resolve(source), {'egg': '0.1'})
+        cached = self.resolver.files[base]
+        self.assertEquals(self.resolver.resolve(source), {'egg': '0.1'})
+        self.assertTrue(self.resolver.files[base] is cached)
+        self.write('base.cfg', '[versions]\negg = 0.10\n')
+        self.assertEquals(self.resolver.resolve(source), {'egg': '0.10'})
+
+    def test_resolve_errors(self):
+        self.assertRaises(OSError, self.resolver.resolve,
+                          os.path.join(self.directory.name, 'missing.cfg'))
+        self.assertEquals(
+            self.resolver.resolve(self.write('empty.cfg', '[buildout]\n')),
+            None)
+        self.write('base.cfg', '[buildout]\nextends = versions.cfg\n'
+                   '[versions]\negg = 0.1\n')
+        source = self.write('versions.cfg', '[buildout]\n'
+                            'extends = base.cfg missing.cfg\n')
+        self.assertEquals(self.resolver.resolve(source), {'egg': '0.1'})
+        self.assertEquals(
+            self.logs.messages['warning'],
+            ["'%s' extended recursively by %s." % (
+                source, os.path.join(self.directory.name, 'base.cfg')),
+             "'%s' extended by %s cannot be read." % (
+                 os.path.join(self.directory.name, 'missing.cfg'), source)])
+
+
 class VersionsConfigParserTestCase(TestCase):
 
     def test_parse_case_insensitive(self):
@@ -355,6 +2158,46 @@ class VersionsConfigParserTestCase(TestCase):
         self.assertEquals(config_parser.options('Section'), ['KEY', 'Key'])
         config_file.close()
 
+    def test_iter_section_options(self):
+        lines = [
+            '# Pinned versions\n',
+            '[buildout]\n',
+            'parts =\n',
+            '    [not-a-section]\n',
+            'eggs: egg\n',
+            '[versions]\n',
+            'egg = 0.1\n',
+            '; comment\n',
+            '\n',
+            'Egg:0.2\n',
+            'spam += 1.0\n',
+            'eggs-=2.0\n',
+            'multi =\n',
+            '  1.0\n',
+            '  2.0\n',
+            '[section]\n',
+            'egg = 9.9\n']
+        options = iter_section_options(lines)
+        self.assertEquals(next(options), ('egg', '', '0.1'))
+        self.assertEquals(list(options), [
+            ('Egg', '', '0.2'), ('spam', '+', '1.0'),
+            ('eggs', '-', '2.0'), ('multi', '', '\n1.0\n2.0')])
+        self.assertEquals(
+            list(iter_section_options(lines, 'section')),
+            [('egg', '', '9.9')])
+
+    def test_iter_section_options_errors(self):
+        for lines, error in [
+                (['[section]\n'], NoSectionError),
+                (['egg = 0.1\n', '[versions]\n'],
+                 MissingSectionHeaderError),
+                (['[versions]\n', '[versions]\n'], DuplicateSectionError),
+                (['[versions]\n', 'egg = 0.1\n', 'egg = 0.2\n'],
+                 DuplicateOptionError),
+                (['[versions]\n', 'egg\n'], ParsingError),
+                (['[versions]\n', '= 0.1\n'], ParsingError)]:
+            self.assertRaises(error, list, iter_section_options(lines))
+
     def test_perfect_indentation(self):
         config_parser = VersionsConfigParser()
         config_parser.add_section('Section')
@@ -776,6 +2619,48 @@ class FindUnusedVersionsTestCase(LogsTestCase,
             config_file.read().decode('utf-8'),
             '[versions]\nEgg     = 1.0\n')
 
+    def test_write_extends(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, 'base.cfg'), 'w') as fd:
+            fd.write('[versions]\nUnused-base=1.0\n')
+        source = os.path.join(directory.name, 'versions.cfg')
+        with open(source, 'w') as fd:
+            fd.write('[buildout]\nextends = base.cfg\n'
+                     '[versions]\nEgg=1.0\nUnused-egg=1.0\n')
+        with self.assertRaises(SystemExit) as context:
+            find_unused_versions.cmdline('%s -w' % source)
+        self.assertEqual(context.exception.code, 0)
+        self.assertLogs(
+            info=['- 2 versions found in %s.' % source,
+                  '- 2 packages need to be checked for updates.',
+                  '- %s updated.' % source],
+            warning=['- Unused-egg is unused.'])
+        self.assertStdOut('- Unused-egg is unused.\n')
+        with open(source) as fd:
+            self.assertEquals(
+                fd.read(),
+                '[buildout]\nextends = base.cfg\n\n'
+                '[versions]\nEgg     = 1.0\n')
+
+    def test_write_extends_no_section(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, 'base.cfg'), 'w') as fd:
+            fd.write('[versions]\nUnused-base=1.0\n')
+        source = os.path.join(directory.name, 'versions.cfg')
+        with open(source, 'w') as fd:
+            fd.write('[buildout]\nextends = base.cfg\n')
+        with self.assertRaises(SystemExit) as context:
+            find_unused_versions.cmdline('%s -w' % source)
+        self.assertEqual(context.exception.code, 0)
+        self.assertLogs(
+            debug=["'versions' section not found in %s." % source],
+            info=['- 0 packages need to be checked for updates.'])
+        self.assertStdOut('')
+        with open(source) as fd:
+            self.assertEquals(fd.read(), '[buildout]\nextends = base.cfg\n')
+
     def test_no_source(self):
         with self.assertRaises(SystemExit) as context:
             find_unused_versions.cmdline('')
@@ -927,6 +2812,10 @@ class CheckUpdatesCommandLineTestCase(LogsTestCase,
                                       StdOutTestCase,
                                       StubbedURLOpenTestCase):
 
+    def setUp(self):
+        super(CheckUpdatesCommandLineTestCase, self).setUp()
+        clear()
+
     def test_no_args_no_source(self):
         with self.assertRaises(SystemExit) as context:
             check_buildout_updates.cmdline('')
@@ -944,10 +2833,15 @@ class CheckUpdatesCommandLineTestCase(LogsTestCase,
         self.assertEqual(context.exception.code, 0)
         self.assertLogs(
             debug=['-> Last version of egg is 0.3.',
+                   '- 0% of the specifiers parsed from the memo '
+                   '(0 hits, 1 misses).',
+                   '- 0% of the versions parsed from the memo '
+                   '(0 hits, 2 misses).',
                    '=> egg current version (0.0.0) and '
                    'last version (0.3) are different.'],
             info=['- 1 packages need to be checked for updates.',
                   '> Fetching latest datas for egg...',
+                  '- 1 requests sent over 1 connections.',
                   '- 1 package updates found.'],
             warning=["'versions.cfg' cannot be read.",
                      '[versions]',
@@ -964,14 +2858,20 @@ class CheckUpdatesCommandLineTestCase(LogsTestCase,
             check_buildout_updates.cmdline('-i unavailable')
         self.assertEqual(context.exception.code, 0)
         self.assertLogs(
-            warning=["'versions.cfg' cannot be read."],
-            debug=['!> https://pypi.python.org/pypi/unavailable/json 404',
-                   '-> Last version of unavailable is 0.0.0.'],
+            warning=["'versions.cfg' cannot be read.",
+                     '- unavailable cannot be checked.'],
+            debug=['!> https://pypi.python.org/pypi/unavailable/json '
+                   'Not Found',
+                   '-> unavailable unknown by the service.',
+                   '- 0% of the specifiers parsed from the memo '
+                   '(0 hits, 1 misses).'],
             info=['- 1 packages need to be checked for updates.',
                   '> Fetching latest datas for unavailable...',
+                  '- 1 requests sent over 1 connections.',
                   '- 0 package updates found.']
         )
-        self.assertStdOut("'versions.cfg' cannot be read.\n")
+        self.assertStdOut("'versions.cfg' cannot be read.\n"
+                          "- unavailable cannot be checked.\n")
 
     def test_include_exclude(self):
         with self.assertRaises(SystemExit) as context:
@@ -1026,11 +2926,16 @@ class CheckUpdatesCommandLineTestCase(LogsTestCase,
         self.assertEqual(context.exception.code, 0)
         self.assertLogs(
             debug=['-> Last version of egg is 0.3.',
+                   '- 0% of the specifiers parsed from the memo '
+                   '(0 hits, 1 misses).',
+                   '- 0% of the versions parsed from the memo '
+                   '(0 hits, 2 misses).',
                    '=> egg current version (0.1) and '
                    'last version (0.3) are different.'],
             info=['- 2 versions found in %s.' % config_file.name,
                   '- 1 packages need to be checked for updates.',
                   '> Fetching latest datas for egg...',
+                  '- 1 requests sent over 1 connections.',
                   '- 1 package updates found.',
                   '- %s updated.' % config_file.name],
             warning=['[versions]',
@@ -1086,11 +2991,48 @@ class CheckUpdatesCommandLineTestCase(LogsTestCase,
             "'versions.cfg' cannot be read.\n"
             "- 1 packages need to be checked for updates.\n"
             "> Fetching latest datas for egg...\n"
+            "- 1 requests sent over 1 connections.\n"
             "- 1 package updates found.\n"
             "[versions]\n"
             "egg = 0.3        #  0.0.0\n"
         )
 
+    def test_write_extends(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, 'base.cfg'), 'w') as fd:
+            fd.write('[versions]\negg=0.1\n')
+        source = os.path.join(directory.name, 'versions.cfg')
+        with open(source, 'w') as fd:
+            fd.write('[buildout]\nextends = base.cfg\n'
+                     '[versions]\nexcluded=1.0\n')
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline('-e excluded -w %s' % source)
+        self.assertEqual(context.exception.code, 0)
+        self.assertLogs(
+            debug=['-> Last version of egg is 0.3.',
+                   '- 0% of the specifiers parsed from the memo '
+                   '(0 hits, 1 misses).',
+                   '- 0% of the versions parsed from the memo '
+                   '(0 hits, 2 misses).',
+                   '=> egg current version (0.1) and '
+                   'last version (0.3) are different.'],
+            info=['- 2 versions found in %s.' % source,
+                  '- 1 packages need to be checked for updates.',
+                  '> Fetching latest datas for egg...',
+                  '- 1 requests sent over 1 connections.',
+                  '- 1 package updates found.',
+                  '- %s updated.' % source],
+            warning=['[versions]',
+                     'egg = 0.3          #  0.1'])
+        with open(source) as fd:
+            self.assertEquals(
+                fd.read(),
+                '[buildout]\n'
+                'extends     = base.cfg\n\n'
+                '[versions]\n'
+                'excluded    = 1.0\n')
+
     def test_output_max(self):
         with self.assertRaises(SystemExit) as context:
             check_buildout_updates.cmdline('-i egg -vvvvvvvvvv')
@@ -1100,6 +3042,11 @@ class CheckUpdatesCommandLineTestCase(LogsTestCase,
             "- 1 packages need to be checked for updates.\n"
             "> Fetching latest datas for egg...\n"
             "-> Last version of egg is 0.3.\n"
+            "- 1 requests sent over 1 connections.\n"
+            "- 0% of the specifiers parsed from the memo "
+            "(0 hits, 1 misses).\n"
+            "- 0% of the versions parsed from the memo "
+            "(0 hits, 2 misses).\n"
             "=> egg current version (0.0.0) and "
             "last version (0.3) are different.\n"
             "- 1 package updates found.\n"
@@ -1116,6 +3063,11 @@ class CheckUpdatesCommandLineTestCase(LogsTestCase,
             "- 1 packages need to be checked for updates.\n"
             "> Fetching latest datas for egg...\n"
             "-> Last version of egg<0.3 is 0.2.\n"
+            "- 1 requests sent over 1 connections.\n"
+            "- 0% of the specifiers parsed from the memo "
+            "(0 hits, 1 misses).\n"
+            "- 0% of the versions parsed from the memo "
+            "(0 hits, 3 misses).\n"
             "=> egg current version (0.0.0) and "
             "last version (0.2) are different.\n"
             "- 1 package updates found.\n"
@@ -1136,24 +3088,201 @@ class CheckUpdatesCommandLineTestCase(LogsTestCase,
         self.assertInStdOut('error: argument -s/--specifier: '
                             'key or value are empty')
 
+    def test_routes_errors(self):
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline('-i egg --route egg')
+        self.assertEqual(context.exception.code, 2)
+        self.assertInStdOut('error: argument --route: '
+                            'key=value syntax not followed')
+
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline('-i egg --host-limit pypi.org=a')
+        self.assertEqual(context.exception.code, 2)
+        self.assertInStdOut('error: argument --host-limit: '
+                            'invalid value: a')
+
+    def test_routes_separator(self):
+        parser = ArgumentParser()
+        parser.add_argument('--route', action=StoreRoutes,
+                            dest='routes', default={})
+        self.assertEquals(
+            parser.parse_args(
+                ['--route', 'egg=https://pypi.company.com/pypi?token=a=b',
+                 '--route', 'spam = http://other.com/pypi']).routes,
+            {'egg': 'https://pypi.company.com/pypi?token=a=b',
+             'spam': 'http://other.com/pypi'})
+
+    def test_threads(self):
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline('-i egg -t auto -vv')
+        self.assertEqual(context.exception.code, 0)
+        self.assertInStdOut('- Concurrency adapted to 5 requests.\n')
+
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline('-i egg -t many')
+        self.assertEqual(context.exception.code, 2)
+        self.assertInStdOut("error: argument -t/--threads: "
+                            "invalid int value or 'auto': 'many'")
+
     def test_handle_error(self):
         with self.assertRaises(SystemExit) as context:
             check_buildout_updates.cmdline('-i error-egg')
-        self.assertTrue(
-            context.exception.code.startswith(
-                'list indices must be integers'
-            )
+        self.assertEquals(context.exception.code,
+                          'No releases found for error-egg')
+
+
+class CheckUpdatesLocalIndexTestCase(StdOutTestCase,
+                                     LocalIndexTestCase):
+
+    def test_engine_asyncio(self):
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline(
+                '-i egg -i egg-dev --engine asyncio --service-url %s' %
+                self.service_url)
+        self.assertEqual(context.exception.code, 0)
+        self.assertStdOut(
+            "'versions.cfg' cannot be read.\n"
+            "[versions]\n"
+            "egg     = 0.3        #  0.0.0\n"
+            "egg-dev = 1.0        #  0.0.0\n"
         )
 
+    def test_unchecked_package(self):
+        service_url = self.service_url.replace('/pypi', '/flaky/pypi')
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline(
+                '-i egg --retries 0 --service-url %s' % service_url)
+        self.assertEqual(context.exception.code, 0)
+        self.assertStdOut(
+            "'versions.cfg' cannot be read.\n"
+            "- egg cannot be checked.\n"
+        )
+
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline(
+                '-i egg --retries 1 --service-url %s' % service_url)
+        self.assertEqual(context.exception.code, 0)
+        self.assertInStdOut("egg = 0.3        #  0.0.0\n")
+        self.assertEquals(self.server.statuses, [503, 200])
+
+    def test_include_unknown(self):
+        with TemporaryDirectory() as directory:
+            for option in ('', '', '--include-unknown'):
+                with self.assertRaises(SystemExit) as context:
+                    check_buildout_updates.cmdline(
+                        '-i unknown --cache-dir %s --service-url %s %s' % (
+                            directory, self.service_url, option))
+                self.assertEqual(context.exception.code, 0)
+        self.assertEquals(self.server.statuses, [404, 404])
+
+    def test_routes(self):
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline(
+                '-i egg -i egg-dev --service-url http://127.0.0.1:1/pypi '
+                '--route egg*=%s --host-limit 127.0.0.1:%s=1' % (
+                    self.service_url, self.server.server_port))
+        self.assertEqual(context.exception.code, 0)
+        self.assertInStdOut("egg     = 0.3        #  0.0.0\n"
+                            "egg-dev = 1.0        #  0.0.0\n")
+
+    def test_rate(self):
+        with TemporaryDirectory() as directory:
+            rate_file = os.path.join(directory, 'rate')
+            with self.assertRaises(SystemExit) as context:
+                check_buildout_updates.cmdline(
+                    '-i egg --rate 100 --rate-file %s --service-url %s' % (
+                        rate_file, self.service_url))
+            self.assertEqual(context.exception.code, 0)
+            self.assertTrue(os.path.exists(rate_file))
+        self.assertInStdOut("egg = 0.3        #  0.0.0\n")
+
+    def test_unavailable_index(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            service_url = 'http://127.0.0.1:%s/pypi' % sock.getsockname()[1]
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline(
+                '-i egg -i egg-dev --retries 0 --max-failures 1 -t 1 '
+                '--service-url %s' % service_url)
+        self.assertTrue(context.exception.code.startswith(
+            '%s is unavailable, 1 packages failed in a row: ' % service_url))
+
+    def test_deadline(self):
+        self.server.delay = 0.5
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline(
+                '-i egg -i egg-dev --deadline 1 --route egg-dev=%s '
+                '--service-url %s' % (
+                    self.service_url.replace('/pypi', '/slow/pypi'),
+                    self.service_url))
+        self.assertEqual(context.exception.code, 0)
+        self.assertStdOut(
+            "'versions.cfg' cannot be read.\n"
+            "- Deadline reached, 1 packages not checked.\n"
+            "- egg-dev cannot be checked.\n"
+            "[versions]\n"
+            "egg = 0.3        #  0.0.0\n"
+        )
+
+    def test_service_url_mirrors(self):
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline(
+                '-i egg --retries 0 --service-url %s --service-url %s' % (
+                    self.service_url.replace('/pypi', '/flaky/pypi'),
+                    self.service_url))
+        self.assertEqual(context.exception.code, 0)
+        self.assertInStdOut("egg = 0.3        #  0.0.0\n")
+        self.assertEquals(self.server.statuses, [503, 200])
+
+    def test_progressive(self):
+        with self.assertRaises(SystemExit) as context:
+            check_buildout_updates.cmdline(
+                '-i egg -i egg-dev --progressive --threads 1 '
+                '--service-url %s' % self.service_url)
+        self.assertEqual(context.exception.code, 0)
+        self.assertStdOut(
+            "'versions.cfg' cannot be read.\n"
+            "[versions]\n"
+            "egg     = 0.3        #  0.0.0\n"
+            "egg-dev = 1.0        #  0.0.0\n"
+        )
+
+    def test_cache_dir(self):
+        with TemporaryDirectory() as directory:
+            for i in range(2):
+                with self.assertRaises(SystemExit) as context:
+                    check_buildout_updates.cmdline(
+                        '-i egg --cache-dir %s --service-url %s' % (
+                            directory, self.service_url))
+                self.assertEqual(context.exception.code, 0)
+        self.assertEquals(self.server.statuses, [200, 304])
+        self.assertInStdOut("egg = 0.3        #  0.0.0\n")
+
 
 loader = TestLoader()
 
 test_suite = TestSuite(
     [loader.loadTestsFromTestCase(VersionsCheckerTestCase),
+     loader.loadTestsFromTestCase(ResponseTestCase),
+     loader.loadTestsFromTestCase(HTTPTransportTestCase),
+     loader.loadTestsFromTestCase(AsyncHTTPTransportTestCase),
+     loader.loadTestsFromTestCase(ReleasesCacheTestCase),
+     loader.loadTestsFromTestCase(CachedVersionsCheckerTestCase),
+     loader.loadTestsFromTestCase(VersionsTestCase),
+     loader.loadTestsFromTestCase(ReleasesTestCase),
+     loader.loadTestsFromTestCase(SimpleAPIVersionsCheckerTestCase),
+     loader.loadTestsFromTestCase(ThrottleTestCase),
+     loader.loadTestsFromTestCase(AdaptiveConcurrencyTestCase),
+     loader.loadTestsFromTestCase(RetryTestCase),
+     loader.loadTestsFromTestCase(RoutedVersionsCheckerTestCase),
+     loader.loadTestsFromTestCase(RetriedVersionsCheckerTestCase),
+     loader.loadTestsFromTestCase(MirroredVersionsCheckerTestCase),
      loader.loadTestsFromTestCase(UnusedVersionsCheckerTestCase),
+     loader.loadTestsFromTestCase(ExtendsResolverTestCase),
      loader.loadTestsFromTestCase(VersionsConfigParserTestCase),
      loader.loadTestsFromTestCase(IndentCommandLineTestCase),
      loader.loadTestsFromTestCase(FindUnusedVersionsTestCase),
-     loader.loadTestsFromTestCase(CheckUpdatesCommandLineTestCase)
+     loader.loadTestsFromTestCase(CheckUpdatesCommandLineTestCase),
+     loader.loadTestsFromTestCase(CheckUpdatesLocalIndexTestCase)
      ]
 )
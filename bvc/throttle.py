@@ -0,0 +1,195 @@
+"""Concurrency and rate limits for Buildout Versions Checker"""
+import asyncio
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class Limit(object):
+    """
+    Fixed limit of concurrent requests.
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+
+    def record(self, started, overloaded=False):
+        """
+        Records the outcome of a request.
+        """
+
+
+class AdaptiveLimit(Limit):
+    """
+    Limit of concurrent requests adapted AIMD-style: it grows
+    while the latency is stable and is halved when the index
+    shows signs of overload.
+    """
+    increase = 1.0
+    decrease = 0.5
+    tolerance = 2.0
+    smoothing = 0.3
+
+    def __init__(self, initial=4, minimum=1, maximum=64):
+        self.window = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.slow_start = True
+        self.latency = None
+        self.baseline = None
+        self.decreased = 0
+
+    @property
+    def concurrency(self):
+        return int(self.window)
+
+    def record(self, started, overloaded=False):
+        """
+        Records the outcome of a request started at a time,
+        the overload being tied to its errors or its latency.
+        """
+        now = time.monotonic()
+        if not overloaded:
+            latency = now - started
+            if self.latency is None:
+                self.latency = latency
+            self.latency += self.smoothing * (latency - self.latency)
+            if self.baseline is None or self.latency < self.baseline:
+                self.baseline = self.latency
+            overloaded = self.latency > self.tolerance * self.baseline
+
+        if overloaded:
+            # The requests started before the last decrease
+            # were sent with the previous limit.
+            if started >= self.decreased:
+                self.window = max(self.minimum,
+                                  self.window * self.decrease)
+                self.slow_start = False
+                self.decreased = now
+            return
+
+        increase = self.increase
+        if not self.slow_start:
+            increase /= self.window
+        self.window = min(self.maximum, self.window + increase)
+
+
+class Throttle(object):
+    """
+    Holds the threads while the requests in flight
+    have reached the limit.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Waits for a free slot and returns the start time of the request.
+        """
+        with self.condition:
+            while self.in_flight >= self.limit.concurrency:
+                self.condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started, overloaded=False):
+        """
+        Frees the slot of a request started at a time.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.limit.record(started, overloaded)
+            self.condition.notify_all()
+
+
+class AsyncThrottle(Throttle):
+    """
+    Holds the tasks while the requests in flight
+    have reached the limit.
+    """
+
+    def __init__(self, limit):
+        super(AsyncThrottle, self).__init__(limit)
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.in_flight < self.limit.concurrency)
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started, overloaded=False):
+        async with self.condition:
+            self.in_flight -= 1
+            self.limit.record(started, overloaded)
+            self.condition.notify_all()
+
+
+class TokenBucket(object):
+    """
+    Rate limit of the requests, as a bucket refilled with
+    tokens at the rate and holding a capacity of tokens.
+    The time when the bucket will be full again can be
+    shared with other processes in a file, the time
+    being read on the clock.
+    """
+
+    def __init__(self, rate, capacity=1, path=None, clock=time.time):
+        self.interval = 1.0 / rate
+        self.tolerance = (capacity - 1) * self.interval
+        self.path = path
+        self.clock = clock
+        self.full = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes the next token and returns the delay
+        before the request can be sent.
+        """
+        with self.lock:
+            if self.path is None:
+                delay, self.full = self.take(self.full)
+                return delay
+
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    full = float(os.read(fd, 64) or 0)
+                except ValueError:
+                    full = 0.0
+                delay, full = self.take(full)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, repr(full).encode('ascii'))
+            finally:
+                os.close(fd)
+            return delay
+
+    def take(self, full):
+        """
+        Takes a token from a bucket full again at a time,
+        returns the delay before it is available
+        and the new time when the bucket is full.
+        """
+        now = self.clock()
+        full = max(full, now)
+        delay = max(0.0, full - self.tolerance - now)
+        return delay, full + self.interval
+
+    def acquire(self):
+        """
+        Waits for the next token.
+        """
+        time.sleep(self.reserve())
@@ -0,0 +1,355 @@
+"""HTTP transport for Buildout Versions Checker"""
+import base64
+import threading
+import time
+import zlib
+from http.client import HTTPConnection
+from http.client import HTTPException
+from http.client import HTTPSConnection
+from urllib.error import HTTPError
+from urllib.error import URLError
+from urllib.parse import unquote
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
+from urllib.request import getproxies
+from urllib.request import proxy_bypass
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+
+def find_proxy(proxies, scheme, host):
+    """
+    Returns the parsed proxy URL to use for reaching a host, if any.
+    """
+    proxy = proxies.get(scheme)
+    if proxy and not proxy_bypass(host):
+        return urlsplit(proxy)
+    return None
+
+
+def proxy_headers(proxy):
+    """
+    Returns the headers authenticating on a proxy.
+    """
+    if not proxy.username:
+        return {}
+    credentials = '%s:%s' % (unquote(proxy.username),
+                             unquote(proxy.password or ''))
+    return {'Proxy-Authorization': 'Basic %s' % base64.b64encode(
+        credentials.encode('utf-8')).decode('ascii')}
+
+
+class ConnectError(URLError):
+    """
+    Raised when a connection to a server cannot be opened,
+    before any response is read.
+    """
+
+
+class Deadline(object):
+    """
+    Time allowed for all the requests fetching a package.
+    """
+
+    def __init__(self, seconds=None):
+        self.expires = None
+        if seconds is not None:
+            self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        """
+        Returns the remaining time, or None without limit.
+        """
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def timeout(self, timeout):
+        """
+        Returns the timeout of an operation, bounded by the
+        remaining time, raises URLError if there is none left.
+        """
+        if self.expires is None:
+            return timeout
+        remaining = self.expires - time.monotonic()
+        if remaining <= 0:
+            raise URLError('timed out')
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+
+class Response(object):
+    """
+    HTTP response streaming its body, the connection
+    is released once the body has been entirely read.
+    """
+    chunk_size = 16384
+
+    def __init__(self, url, status, reason, headers,
+                 stream=None, release=None, socket=None,
+                 timeout=None, deadline=None):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.stream = stream
+        self.release = release
+        self.socket = socket
+        self.timeout = timeout
+        self.deadline = deadline or Deadline()
+        self.encoding = headers.get('Content-Encoding', '').strip().lower()
+        self.decoder = None
+        self.decoded = False
+        if self.encoding in ('gzip', 'x-gzip'):
+            self.decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self.decoder = zlib.decompressobj()
+        self.consumed = (stream is None or status in (204, 304) or
+                         headers.get('Content-Length') == '0')
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def chunk_timeout(self):
+        """
+        Returns the timeout for reading the next chunk,
+        within the deadline of the request.
+        """
+        timeout = self.deadline.timeout(self.timeout)
+        if self.socket is not None:
+            self.socket.settimeout(timeout)
+        return timeout
+
+    def decompress(self, data):
+        """
+        Decompresses a part of the body, a deflate body without
+        the zlib wrapper being accepted like the browsers do.
+        """
+        try:
+            data = self.decoder.decompress(data, self.chunk_size)
+        except zlib.error as error:
+            if self.encoding != 'deflate' or self.decoded:
+                raise URLError('Invalid %s content: %s' % (
+                    self.encoding, error))
+            self.decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self.decompress(data)
+        self.decoded = True
+        return data
+
+    def decode(self, chunk):
+        """
+        Yields the decoded pieces of a chunk of the body,
+        each one bounded by the chunk size, or the remaining
+        pieces at the end of the body.
+        """
+        if self.decoder is None:
+            if chunk:
+                yield chunk
+            return
+
+        if not chunk:
+            piece = self.decoder.flush()
+            if piece:
+                yield piece
+            return
+
+        while chunk:
+            piece = self.decompress(chunk)
+            chunk = self.decoder.unconsumed_tail
+            if piece:
+                yield piece
+
+    def iter_chunks(self):
+        """
+        Yields the decoded chunks of the body as they are received.
+        """
+        try:
+            while not self.consumed:
+                self.chunk_timeout()
+                try:
+                    chunk = self.stream.read1(self.chunk_size)
+                except (HTTPException, OSError) as error:
+                    raise URLError(error)
+                if not chunk:
+                    self.consumed = True
+                for piece in self.decode(chunk):
+                    yield piece
+        finally:
+            self.close()
+
+    def read(self):
+        return b''.join(self.iter_chunks())
+
+    def close(self):
+        """
+        Releases the connection, which can only be
+        reused if the body has been entirely read.
+        """
+        release, self.release = self.release, None
+        if release is not None:
+            release(self.consumed)
+
+
+class HTTPTransport(object):
+    """
+    HTTP client keeping persistent connections per host,
+    shared by the threads and reused across requests.
+    """
+    max_redirects = 5
+    user_agent = 'buildout-versions-checker'
+
+    def __init__(self, timeout=10, connect_timeout=None, read_timeout=None):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout or timeout
+        self.read_timeout = read_timeout or timeout
+        self.proxies = getproxies()
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.closed = False
+        self.connections = 0
+        self.requests = 0
+
+    def get_connection(self, scheme, netloc):
+        """
+        Returns an idle connection for a host,
+        creating a new one if none is available.
+        """
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+
+        connection_class = HTTPSConnection
+        if scheme == 'http':
+            connection_class = HTTPConnection
+
+        target = urlsplit('//%s' % netloc)
+        proxy = find_proxy(self.proxies, scheme, target.hostname)
+        headers = {}
+        if proxy is None:
+            connection = connection_class(
+                netloc, timeout=self.connect_timeout)
+        else:
+            connection = connection_class(
+                proxy.netloc.rpartition('@')[2],
+                timeout=self.connect_timeout)
+            headers = proxy_headers(proxy)
+            if scheme == 'https':
+                connection.set_tunnel(target.hostname, target.port,
+                                      headers=headers)
+                headers = {}
+        connection.proxy_headers = headers
+        connection.proxied = proxy is not None and scheme == 'http'
+
+        with self.lock:
+            self.connections += 1
+        return connection, False
+
+    def release_connection(self, scheme, netloc, connection):
+        """
+        Puts back a connection among the idle ones of a host,
+        or closes it if the transport is closed.
+        """
+        with self.lock:
+            if not self.closed:
+                self.idle.setdefault(
+                    (scheme, netloc), []).append(connection)
+                return
+        connection.close()
+
+    def send(self, url, headers={}, deadline=None):
+        """
+        Sends a GET request on a persistent connection
+        and returns the response, before reading its body.
+        """
+        deadline = deadline or Deadline()
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+
+        while True:
+            connection, reused = self.get_connection(
+                parts.scheme, parts.netloc)
+            request_headers = {'User-Agent': self.user_agent,
+                               'Accept-Encoding': ACCEPT_ENCODING}
+            request_headers.update(headers)
+            request_headers.update(connection.proxy_headers)
+            target = path
+            if connection.proxied:
+                target = url
+            try:
+                with self.lock:
+                    self.requests += 1
+                if connection.sock is None:
+                    connection.timeout = deadline.timeout(
+                        self.connect_timeout)
+                    try:
+                        connection.connect()
+                    except (HTTPException, OSError) as error:
+                        raise ConnectError(error)
+                sock = connection.sock
+                sock.settimeout(deadline.timeout(self.read_timeout))
+                connection.request('GET', target, headers=request_headers)
+                response = connection.getresponse()
+            except URLError:
+                connection.close()
+                raise
+            except (HTTPException, OSError) as error:
+                connection.close()
+                if reused:
+                    # The server has closed the idle connection,
+                    # retry once on a fresh one.
+                    continue
+                raise URLError(error)
+
+            def release(reusable, connection=connection, response=response):
+                if reusable and not response.will_close:
+                    # Closes the exhausted response,
+                    # so the connection accepts a new request.
+                    response.read()
+                    self.release_connection(
+                        parts.scheme, parts.netloc, connection)
+                else:
+                    connection.close()
+
+            return Response(url, response.status, response.reason,
+                            response.headers, response, release,
+                            sock, self.read_timeout, deadline)
+
+    def urlopen(self, url, headers={}, deadline=None):
+        """
+        Opens an URL like urllib.request.urlopen does,
+        following the redirections within the deadline.
+        """
+        for redirection in range(self.max_redirects + 1):
+            response = self.send(url, headers, deadline)
+            location = response.getheader('Location')
+            if response.status in REDIRECT_CODES and location:
+                response.read()
+                url = urljoin(url, location)
+                continue
+            if response.status >= 400:
+                response.read()
+                raise HTTPError(url, response.status, response.reason,
+                                response.headers, None)
+            return response
+
+        raise HTTPError(url, response.status,
+                        'Too many redirections',
+                        response.headers, None)
+
+    def close(self):
+        """
+        Closes all the persistent connections.
+        """
+        with self.lock:
+            connections = [connection for idle in self.idle.values()
+                           for connection in idle]
+            self.idle.clear()
+            self.closed = True
+        for connection in connections:
+            connection.close()
@@ -0,0 +1,51 @@
+"""Memoized versions and specifiers for Buildout Versions Checker"""
+from functools import lru_cache
+
+from packaging.specifiers import SpecifierSet
+from packaging.version import parse
+
+MAX_VERSIONS = 10000
+
+MAX_SPECIFIERS = 1000
+
+
+@lru_cache(maxsize=MAX_VERSIONS)
+def parse_version(version):
+    """
+    Returns the parsed version of a string,
+    shared by the identical strings.
+    """
+    return parse(version)
+
+
+@lru_cache(maxsize=MAX_SPECIFIERS)
+def specifier_set(specifier, allow_pre_releases):
+    """
+    Returns the set of specifiers of a string,
+    shared by the identical strings.
+    """
+    return SpecifierSet(specifier, allow_pre_releases)
+
+
+def hit_rates():
+    """
+    Returns the hits, misses and hit rate
+    of the memoized versions and specifiers.
+    """
+    rates = {}
+    for name, function in (('versions', parse_version),
+                           ('specifiers', specifier_set)):
+        info = function.cache_info()
+        lookups = info.hits + info.misses
+        rates[name] = (info.hits, info.misses,
+                       lookups and float(info.hits) / lookups)
+    return rates
+
+
+def clear():
+    """
+    Forgets the memoized versions and specifiers,
+    resetting their counters.
+    """
+    parse_version.cache_clear()
+    specifier_set.cache_clear()